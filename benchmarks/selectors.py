@@ -0,0 +1,60 @@
+"""
+Пропускная способность селекторов кадров на синтетическом видео 720p.
+Запуск из корня проекта: `python -m benchmarks.selectors`
+"""
+import time
+
+import cv2
+import numpy as np
+
+from src.schemas import SelectorType
+from src.services.screenshots.frame_selector import get_selector
+
+
+SECONDS = 300
+WIDTH = 1280
+HEIGHT = 720
+SCREENSHOTS = 3
+
+
+def _make_frames() -> list[np.ndarray]:
+    """Чередует «слайды» с фигурами и текстом, однотонные кадры и размытый шум, по кадру в секунду"""
+    rng = np.random.default_rng(0)
+    frames = []
+    for second in range(SECONDS):
+        kind = second // 20 % 3
+        if kind == 0:
+            frame = np.full((HEIGHT, WIDTH, 3), 255, np.uint8)
+            for shape in range(5):
+                top_left = tuple(int(value) for value in rng.integers(0, 600, 2))
+                cv2.rectangle(frame, top_left, (top_left[0] + 200, top_left[1] + 100), (0, 0, 0), 3)
+                cv2.circle(frame, (200 + shape * 200, 600), 50, (0, 0, 255), 3)
+            cv2.putText(
+                frame, f'Slide {second}', (50, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 3
+            )
+        elif kind == 1:
+            frame = np.full((HEIGHT, WIDTH, 3), second % 255, np.uint8)
+        else:
+            noise = rng.integers(0, 255, (HEIGHT // 16, WIDTH // 16, 3), dtype=np.uint8)
+            frame = cv2.resize(noise, (WIDTH, HEIGHT), interpolation=cv2.INTER_CUBIC)
+        frames.append(frame)
+    return frames
+
+
+def main() -> None:
+    frames = _make_frames()
+    for selector_type in SelectorType:
+        selector = get_selector(selector_type)(SCREENSHOTS, 0, SECONDS)
+        start_time = time.perf_counter()
+        for second, frame in enumerate(frames):
+            selector.feed(frame, second)
+        result = selector.get_result()
+        elapsed = time.perf_counter() - start_time
+        print(
+            f'{selector_type.value:<18} {elapsed * 1000:8.1f} ms  '
+            f'{len(frames) / elapsed:8.1f} frames/s  selected {len(result)}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Сравнение способов сериализации статьи с 30 изображениями в base64: время и пиковая память.
+Запуск из корня проекта: `python -m benchmarks.serialization`
+"""
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+
+from src.schemas import Article, ArticleTopic, GenerationTime
+from src.utils.json_ import dumps, iter_dumps
+
+
+IMAGES = 30
+IMAGE_SIZE = 1024 * 1024
+TOPICS = 10
+
+
+def _make_article() -> Article:
+    images_per_topic = IMAGES // TOPICS
+    return Article(
+        title='Benchmark',
+        description='Article with base64 images',
+        topics=[ArticleTopic(
+            start='0:00:00',
+            end='0:01:00',
+            title=f'Topic {topic}',
+            paragraphs='[00:00:00 - 00:00:10] Текст темы',
+            images=[
+                base64.b64encode(os.urandom(IMAGE_SIZE)).decode()
+                for _ in range(images_per_topic)
+            ],
+        ) for topic in range(TOPICS)],
+        generation_time=GenerationTime(),
+    )
+
+
+def _fastapi_default(article: Article) -> int:
+    """То, что делал FastAPI: dict(), jsonable_encoder и стандартный json"""
+    content = jsonable_encoder(article.dict())
+    return len(json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _direct(article: Article) -> int:
+    return len(dumps(article.dict()))
+
+
+def _streaming(article: Article) -> int:
+    return sum(len(chunk) for chunk in iter_dumps(article.dict()))
+
+
+def main() -> None:
+    article = _make_article()
+    for name, serializer in (
+        ('fastapi default', _fastapi_default),
+        ('direct bytes', _direct),
+        ('streaming', _streaming),
+    ):
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        size = serializer(article)
+        elapsed = time.perf_counter() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f'{name:<16} {elapsed * 1000:8.1f} ms  peak {peak / 1024 / 1024:7.1f} MiB  '
+            f'body {size / 1024 / 1024:.1f} MiB'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,21 @@
+from typing import Optional
+
 from aiohttp import ClientSession
 
+from .jobs.job_queue_abc import JobQueue
+from .jobs.redis_ import RedisJobQueue
+from .jobs.sqlite import SqliteJobQueue
+from .services.admission import AdmissionController
+from .services.media import MediaCache
+from .services.scheduler import PipelineScheduler
+from .settings import (
+    TRANSCRIPT_WORKERS, LLM_WORKERS, FRAME_WORKERS, DOWNLOAD_WORKERS,
+    ADMISSION_MEMORY_MB, ADMISSION_CPU, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_RESOLVE_WORKERS,
+    JOB_QUEUE_BACKEND, JOB_QUEUE_PATH, JOB_QUEUE_URL, JOB_HEARTBEAT_TIMEOUT, JOB_MAX_ATTEMPTS,
+    MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_MB,
+)
+
 
 class _HttpClient:
     session: ClientSession
@@ -14,4 +30,76 @@ class _HttpClient:
         return self.session
 
 
+class _Scheduler:
+    scheduler: PipelineScheduler
+
+    def start(self):
+        self.scheduler = PipelineScheduler(
+            transcript_workers=TRANSCRIPT_WORKERS,
+            llm_workers=LLM_WORKERS,
+            frame_workers=FRAME_WORKERS,
+            download_workers=DOWNLOAD_WORKERS,
+        )
+
+    def stop(self):
+        self.scheduler.shutdown()
+
+    def __call__(self) -> PipelineScheduler:
+        return self.scheduler
+
+
+class _Admission:
+    controller: AdmissionController
+
+    def start(self):
+        self.controller = AdmissionController(
+            memory_budget=ADMISSION_MEMORY_MB * 1024 * 1024,
+            cpu_budget=ADMISSION_CPU,
+            max_queue=ADMISSION_MAX_QUEUE,
+            queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+            resolve_workers=ADMISSION_RESOLVE_WORKERS,
+            media_cache=media_cache(),
+        )
+
+    def __call__(self) -> AdmissionController:
+        return self.controller
+
+
+class _JobQueue:
+    queue: JobQueue
+
+    def start(self):
+        queues_mapping = {
+            'sqlite': lambda: SqliteJobQueue(
+                JOB_QUEUE_PATH,
+                heartbeat_timeout=JOB_HEARTBEAT_TIMEOUT,
+                max_attempts=JOB_MAX_ATTEMPTS,
+            ),
+            'redis': lambda: RedisJobQueue(
+                JOB_QUEUE_URL,
+                heartbeat_timeout=JOB_HEARTBEAT_TIMEOUT,
+                max_attempts=JOB_MAX_ATTEMPTS,
+            ),
+        }
+        self.queue = queues_mapping[JOB_QUEUE_BACKEND]()
+
+    def __call__(self) -> JobQueue:
+        return self.queue
+
+
+class _MediaCache:
+    cache: Optional[MediaCache] = None
+
+    def start(self):
+        if MEDIA_CACHE_MAX_MB > 0:
+            self.cache = MediaCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_MB * 1024 * 1024)
+
+    def __call__(self) -> Optional[MediaCache]:
+        return self.cache
+
+
 http_client = _HttpClient()
+pipeline_scheduler = _Scheduler()
+admission_controller = _Admission()
+job_queue = _JobQueue()
+media_cache = _MediaCache()
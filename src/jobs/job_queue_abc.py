@@ -0,0 +1,45 @@
+from __future__ import annotations
+from abc import abstractmethod, ABC
+from typing import Optional
+
+from src.schemas import Article, ArticleRequest, Job
+
+
+class JobQueue(ABC):
+    """
+    Очередь заданий на генерацию статей между API и воркерами.
+    Воркер забирает задание через `claim` и периодически подтверждает, что ещё работает над ним,
+    через `heartbeat`. Задание воркера, который перестал присылать heartbeat, снова выдаётся
+    другому воркеру, пока не будет исчерпано количество попыток
+    """
+    def __init__(self, heartbeat_timeout: float, max_attempts: int) -> None:
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def enqueue(self, request: ArticleRequest) -> str:
+        """Добавляет задание и возвращает его id"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """Выдаёт воркеру самое старое ожидающее или брошенное задание"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Продлевает задание, возвращает False, если оно больше не принадлежит воркеру"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, article: Article) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        """Возвращает задание в очередь или помечает его проваленным, если попытки кончились"""
+        raise NotImplementedError
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import time
+import uuid
+from typing import Optional
+
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+from src.schemas import Article, ArticleRequest, Job, JobStatus
+from .job_queue_abc import JobQueue
+
+
+# Брошенные задания с исчерпанными попытками проваливаются, остальные возвращаются в очередь,
+# затем выдаётся самое старое ожидающее задание
+_CLAIM = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[2])
+for _, stale_id in ipairs(stale) do
+    local key = ARGV[5] .. stale_id
+    redis.call('ZREM', KEYS[2], stale_id)
+    redis.call('HDEL', key, 'worker_id')
+    redis.call('HSET', key, 'updated_at', ARGV[1])
+    if tonumber(redis.call('HGET', key, 'attempts')) >= tonumber(ARGV[3]) then
+        redis.call('HSET', key, 'status', 'failed', 'error', 'Worker stopped responding')
+    else
+        redis.call('HSET', key, 'status', 'queued')
+        redis.call('ZADD', KEYS[1], redis.call('HGET', key, 'created_at'), stale_id)
+    end
+end
+local ids = redis.call('ZRANGE', KEYS[1], 0, 0)
+if #ids == 0 then
+    return false
+end
+local key = ARGV[5] .. ids[1]
+redis.call('ZREM', KEYS[1], ids[1])
+redis.call('ZADD', KEYS[2], ARGV[1], ids[1])
+redis.call('HINCRBY', key, 'attempts', 1)
+redis.call(
+    'HSET', key, 'status', 'running', 'worker_id', ARGV[4], 'heartbeat', ARGV[1],
+    'updated_at', ARGV[1]
+)
+return ids[1]
+"""
+
+_HEARTBEAT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running'
+        or redis.call('HGET', KEYS[1], 'worker_id') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'heartbeat', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+_COMPLETE = """
+if redis.call('HGET', KEYS[1], 'worker_id') ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[1], 'error')
+redis.call('HSET', KEYS[1], 'status', 'done', 'result', ARGV[3], 'updated_at', ARGV[4])
+return 1
+"""
+
+_FAIL = """
+if redis.call('HGET', KEYS[1], 'worker_id') ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[1], 'worker_id')
+redis.call('HSET', KEYS[1], 'error', ARGV[3], 'updated_at', ARGV[4])
+if tonumber(redis.call('HGET', KEYS[1], 'attempts')) >= tonumber(ARGV[5]) then
+    redis.call('HSET', KEYS[1], 'status', 'failed')
+else
+    redis.call('HSET', KEYS[1], 'status', 'queued')
+    redis.call('ZADD', KEYS[3], redis.call('HGET', KEYS[1], 'created_at'), ARGV[1])
+end
+return 1
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Очередь заданий в Redis для API и воркеров на разных узлах.
+    Задание хранится в хэше, ожидающие упорядочены по времени создания, выполняемые - по последнему
+    heartbeat. Каждая операция выполняется одним Lua-скриптом, поэтому выдача заданий атомарна.
+    Ключи строятся внутри скриптов, так что нужен один сервер Redis (можно с репликами),
+    а не кластер. Время берётся с часов воркеров, они должны быть синхронизированы (NTP)
+    """
+    def __init__(
+        self,
+        url: str,
+        heartbeat_timeout: float,
+        max_attempts: int,
+        prefix: str = 'vid2atl:jobs',
+    ) -> None:
+        super().__init__(heartbeat_timeout, max_attempts)
+        if redis is None:
+            raise RuntimeError(
+                'Redis job queue requires redis, install it with `poetry install -E redis`'
+            )
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._job_prefix = f'{prefix}:job:'
+        self._queued_key = f'{prefix}:queued'
+        self._running_key = f'{prefix}:running'
+        self._claim = self.client.register_script(_CLAIM)
+        self._heartbeat = self.client.register_script(_HEARTBEAT)
+        self._complete = self.client.register_script(_COMPLETE)
+        self._fail = self.client.register_script(_FAIL)
+
+    def enqueue(self, request: ArticleRequest) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.client.pipeline() as pipeline:
+            pipeline.hset(self._job_key(job_id), mapping={
+                'status': JobStatus.QUEUED.value,
+                'request': request.json(),
+                'attempts': 0,
+                'created_at': now,
+                'updated_at': now,
+            })
+            pipeline.zadd(self._queued_key, {job_id: now})
+            pipeline.execute()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        fields = self.client.hgetall(self._job_key(job_id))
+        return _fields_to_job(job_id, fields) if fields else None
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        now = time.time()
+        job_id = self._claim(
+            keys=[self._queued_key, self._running_key],
+            args=[now, now - self.heartbeat_timeout, self.max_attempts, worker_id,
+                  self._job_prefix],
+        )
+        return self.get(job_id) if job_id else None
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        return bool(self._heartbeat(
+            keys=[self._job_key(job_id), self._running_key],
+            args=[job_id, worker_id, time.time()],
+        ))
+
+    def complete(self, job_id: str, worker_id: str, article: Article) -> None:
+        self._complete(
+            keys=[self._job_key(job_id), self._running_key],
+            args=[job_id, worker_id, article.json(), time.time()],
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        self._fail(
+            keys=[self._job_key(job_id), self._running_key, self._queued_key],
+            args=[job_id, worker_id, error, time.time(), self.max_attempts],
+        )
+
+    def _job_key(self, job_id: str) -> str:
+        return f'{self._job_prefix}{job_id}'
+
+
+def _fields_to_job(job_id: str, fields: dict[str, str]) -> Job:
+    return Job(
+        id=job_id,
+        status=fields['status'],
+        attempts=int(fields['attempts']),
+        request=ArticleRequest.parse_raw(fields['request']),
+        result=Article.parse_raw(fields['result']) if fields.get('result') else None,
+        error=fields.get('error'),
+    )
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+from typing import Iterator, Optional
+
+from src.schemas import Article, ArticleRequest, Job, JobStatus
+from .job_queue_abc import JobQueue
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    heartbeat REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class SqliteJobQueue(JobQueue):
+    """
+    Очередь заданий в файле SQLite. Выдача заданий атомарна за счёт BEGIN IMMEDIATE.
+    Только для одного узла: API и воркеры должны работать на одной машине с локальным диском.
+    Режим WAL держит индекс в разделяемой памяти и не работает на сетевых файловых системах
+    (NFS, SMB, тома облачных дисков с общим доступом), блокировки там ненадёжны и база может
+    повредиться. Для нескольких узлов есть `RedisJobQueue`
+    """
+    def __init__(self, path: str, heartbeat_timeout: float, max_attempts: int) -> None:
+        super().__init__(heartbeat_timeout, max_attempts)
+        self.path = path
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            connection.executescript(_SCHEMA)
+
+    def enqueue(self, request: ArticleRequest) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO jobs (id, status, request, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (job_id, JobStatus.QUEUED.value, request.json(), now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._transaction() as connection:
+            row = connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        now = time.time()
+        stale = now - self.heartbeat_timeout
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, error = ?, worker_id = NULL, updated_at = ? '
+                'WHERE status = ? AND heartbeat < ? AND attempts >= ?',
+                (JobStatus.FAILED.value, 'Worker stopped responding', now,
+                 JobStatus.RUNNING.value, stale, self.max_attempts),
+            )
+            row = connection.execute(
+                'SELECT id FROM jobs WHERE status = ? OR (status = ? AND heartbeat < ?) '
+                'ORDER BY created_at LIMIT 1',
+                (JobStatus.QUEUED.value, JobStatus.RUNNING.value, stale),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                'UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, '
+                'heartbeat = ?, updated_at = ? WHERE id = ?',
+                (JobStatus.RUNNING.value, worker_id, now, now, row['id']),
+            )
+            row = connection.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+        return _row_to_job(row)
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker_id = ? AND status = ?',
+                (time.time(), job_id, worker_id, JobStatus.RUNNING.value),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, article: Article) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? '
+                'WHERE id = ? AND worker_id = ?',
+                (JobStatus.DONE.value, article.json(), time.time(), job_id, worker_id),
+            )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                'UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                'error = ?, worker_id = NULL, updated_at = ? WHERE id = ? AND worker_id = ?',
+                (self.max_attempts, JobStatus.FAILED.value, JobStatus.QUEUED.value,
+                 error, time.time(), job_id, worker_id),
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as connection:
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        id=row['id'],
+        status=row['status'],
+        attempts=row['attempts'],
+        request=ArticleRequest.parse_raw(row['request']),
+        result=Article.parse_raw(row['result']) if row['result'] else None,
+        error=row['error'],
+    )
@@ -1,25 +1,56 @@
+import asyncio
 from contextlib import asynccontextmanager
 from logging.config import dictConfig
+from typing import Any, Coroutine, Optional, TypeVar
 
-from fastapi import FastAPI, Depends
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Path, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from aiohttp import ClientSession
 
-from .schemas import ArticleRequest
-from .dependencies import http_client
+from .schemas import (
+    AdmissionStats, Article, ArticleRequest, BatchArticleRequest, JobCreated, MediaUploaded,
+    PostrocessorType,
+)
+from .dependencies import (
+    http_client, pipeline_scheduler, admission_controller, job_queue, media_cache,
+)
+from .jobs.job_queue_abc import JobQueue
+from .services.admission import AdmissionController, AdmissionRejected
 from .services.article import ArticleGenerator
-from .logger import LogConfig
+from .services.batch import expand_batch_request, generate_articles
+from .services.media import MediaCache, create_upload_path, get_local_media_path
+from .services.profiling import RequestProfiler, check_profiling_available, get_profile_path
+from .services.scheduler import PipelineScheduler
+from .settings import (
+    BATCH_MAX_SIZE, DEPLOYMENT_MODE, DISCONNECT_POLL_INTERVAL, PROFILING, MEDIA_UPLOAD_MAX_MB,
+)
+from .logger import LogConfig, get_logger
+from .utils.json_ import aiter_dumps, dumps
 from .utils.pytube_hotfix import fix
 
 
 dictConfig(LogConfig().dict())
 fix()
+logger = get_logger()
+T = TypeVar('T')
+_PROFILE_NAME_REGEX = r'^[\w-][\w.-]*$'
 
 
 @asynccontextmanager
 async def _lifespan(_: FastAPI):
+    if PROFILING != 'off':
+        check_profiling_available()
     http_client.start()
+    pipeline_scheduler.start()
+    if DEPLOYMENT_MODE == 'api':
+        job_queue.start()
+    else:
+        media_cache.start()
+    admission_controller.start()
     yield
+    pipeline_scheduler.stop()
     await http_client.stop()
 
 app = FastAPI(lifespan=_lifespan)
@@ -33,11 +64,199 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(AdmissionRejected)
+async def _admission_rejected_handler(_: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={'detail': str(exc)},
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
+async def _cancel_on_disconnect(request: Request, coro: Coroutine[Any, Any, T]) -> T:
+    """Выполняет корутину, отменяя её, если клиент закрыл соединение"""
+    task = asyncio.create_task(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info('Client disconnected from %s, cancelling', request.url.path)
+                raise HTTPException(status_code=499, detail='Client closed request')
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def _enqueue(
+    request: Request,
+    queue: JobQueue,
+    article_request: ArticleRequest,
+) -> JobCreated:
+    """Ставит запрос в очередь воркерам (распределённый режим)"""
+    job_id = await run_in_threadpool(queue.enqueue, article_request)
+    logger.info('Enqueued job %s for %s', job_id, article_request.source)
+    return JobCreated(job_id=job_id, status_url=str(request.url_for('get_job', job_id=job_id)))
+
+
+def _check_media_path(article_request: ArticleRequest) -> None:
+    """Проверяет, что локальный файл из запроса существует, до постановки в работу"""
+    if not article_request.path:
+        return
+    try:
+        get_local_media_path(article_request.path)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+def _get_profiler(x_profile: Optional[str] = Header(default=None)) -> Optional[RequestProfiler]:
+    """Создаёт профайлер, если профилирование включено для всех запросов или заголовком"""
+    if PROFILING == 'always' or (PROFILING == 'header' and x_profile == '1'):
+        return RequestProfiler()
+    return None
+
+
 @app.post("/article/")
 async def create_article(
     article_request: ArticleRequest,
+    request: Request,
+    session: ClientSession = Depends(http_client),
+    scheduler: PipelineScheduler = Depends(pipeline_scheduler),
+    admission: AdmissionController = Depends(admission_controller),
+    profiler: Optional[RequestProfiler] = Depends(_get_profiler),
+    cache: Optional[MediaCache] = Depends(media_cache),
+):
+    _check_media_path(article_request)
+    if DEPLOYMENT_MODE == 'api':
+        job = await _enqueue(request, job_queue(), article_request)
+        return JSONResponse(status_code=202, content=job.dict())
+
+    async def generate() -> Article:
+        async with admission.admit(article_request) as video_stream:
+            generator = ArticleGenerator(
+                request=article_request,
+                session=session,
+                scheduler=scheduler,
+                profiler=profiler,
+                media_cache=cache,
+                video_stream=video_stream,
+            )
+            if profiler is None:
+                return await generator.generate_article()
+            async with profiler.profile('generate_article'):
+                return await generator.generate_article()
+
+    article = await _cancel_on_disconnect(request, generate())
+    headers = {}
+    if profiler is not None:
+        headers['X-Profile-Url'] = str(request.url_for('get_profile', name=profiler.name))
+    # Ответ сериализуется напрямую, без повторной валидации и jsonable_encoder FastAPI.
+    # Статьи с изображениями в base64 весят мегабайты, поэтому они отдаются потоком
+    if article_request.image_format == PostrocessorType.BASE64:
+        return StreamingResponse(
+            aiter_dumps(article.dict()), media_type='application/json', headers=headers
+        )
+    return Response(dumps(article.dict()), media_type='application/json', headers=headers)
+
+
+@app.post("/articles/")
+async def create_articles(
+    batch_request: BatchArticleRequest,
+    request: Request,
     session: ClientSession = Depends(http_client),
+    scheduler: PipelineScheduler = Depends(pipeline_scheduler),
+    admission: AdmissionController = Depends(admission_controller),
+    cache: Optional[MediaCache] = Depends(media_cache),
+):
+    """Генерирует статьи для нескольких видео, отдавая их в формате NDJSON по мере готовности"""
+    requests = await expand_batch_request(batch_request, BATCH_MAX_SIZE)
+    if len(requests) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f'Batch contains more than {BATCH_MAX_SIZE} videos',
+        )
+    if DEPLOYMENT_MODE == 'api':
+        queue = job_queue()
+        jobs = [await _enqueue(request, queue, article_request) for article_request in requests]
+        return JSONResponse(status_code=202, content=[job.dict() for job in jobs])
+    results = generate_articles(requests, session, scheduler, admission, cache)
+    return StreamingResponse(
+        (dumps(result.dict()) + b'\n' async for result in results),
+        media_type='application/x-ndjson',
+    )
+
+
+@app.post("/media/", response_model=MediaUploaded)
+async def upload_media(request: Request, filename: str = ''):
+    """
+    Загружает видео телом запроса. Возвращённый `path` указывается в запросе статьи вместо `url`.
+    Расширение файла берётся из `filename`
+    """
+    max_bytes = MEDIA_UPLOAD_MAX_MB * 1024 * 1024
+    relative_path, path = create_upload_path(filename)
+    uploaded = 0
+    try:
+        with open(path, 'wb') as file:
+            async for chunk in request.stream():
+                uploaded += len(chunk)
+                if uploaded > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f'File is larger than {MEDIA_UPLOAD_MAX_MB} MB',
+                    )
+                await run_in_threadpool(file.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    logger.info('Uploaded %s (%d bytes)', relative_path, uploaded)
+    return MediaUploaded(path=relative_path)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Состояние задания и готовая статья в распределённом режиме"""
+    if DEPLOYMENT_MODE != 'api':
+        raise HTTPException(status_code=404, detail='Jobs are available only in api mode')
+    job = await run_in_threadpool(job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return Response(dumps(job.dict()), media_type='application/json')
+
+
+@app.get("/admission/", response_model=AdmissionStats)
+async def get_admission_stats(
+    admission: AdmissionController = Depends(admission_controller),
 ):
-    generator = ArticleGenerator(request=article_request, session=session)
-    article = await generator.generate_article()
-    return article.dict()
+    """Текущая загрузка: занятый бюджет, глубина очереди и количество отклонённых запросов"""
+    return admission.stats()
+
+
+_profiles_router = APIRouter()
+
+
+@_profiles_router.get("/profiles/{name}/")
+async def get_profile(name: str = Path(regex=_PROFILE_NAME_REGEX)):
+    """Список файлов профилирования запроса"""
+    directory = get_profile_path(name)
+    if not directory.is_dir():
+        raise HTTPException(status_code=404, detail='Profile not found')
+    return sorted(path.name for path in directory.iterdir())
+
+
+@_profiles_router.get("/profiles/{name}/{file_name}")
+async def get_profile_file(
+    name: str = Path(regex=_PROFILE_NAME_REGEX),
+    file_name: str = Path(regex=_PROFILE_NAME_REGEX),
+):
+    """Файл профилирования: speedscope (открывается на https://www.speedscope.app) или этапы"""
+    path = get_profile_path(name, file_name)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail='Profile file not found')
+    return FileResponse(path)
+
+
+if PROFILING != 'off':
+    app.include_router(_profiles_router)
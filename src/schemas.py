@@ -1,12 +1,16 @@
 from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator
 from pydantic.dataclasses import dataclass
 
+from src.utils.youtube import YOUTUBE_REGEX
 
-_YOUTUBE_REGEX = r'^.*(youtu\.be\/|v\/|u\/\w\/|embed\/|watch\?v=|\&v=)([^#\&\?]*).*'
+
+_PLAYLIST_REGEX = r'^.*[?&]list=([^#\&\?]+).*'
 _TIME_REGEX = r'^\d{1,2}:\d{1,2}:\d{1,2}$'
+# Путь относительно MEDIA_ROOT, без абсолютных путей и частей, начинающихся с точки
+_MEDIA_PATH_REGEX = r'^(?!/)(?!(.*/)?\.)[\w./-]+$'
 
 
 @dataclass
@@ -17,6 +21,18 @@ class TranscriptEntry:
     duration: float
 
 
+class TranscriptGranularity(str, Enum):
+    RAW = 'raw'
+    SENTENCE = 'sentence'
+    WINDOW = 'window'
+
+
+class DecodeMode(str, Enum):
+    NATIVE = 'native'
+    KEYFRAMES = 'keyframes'
+    LOW_FPS = 'low_fps'
+
+
 class PostrocessorType(str, Enum):
     BASE64 = 'base64'
     IMGUR = 'imgur'
@@ -26,18 +42,57 @@ class SelectorType(str, Enum):
     UNIFORM = 'uniform'
     SIMILARITY = 'similarity'
     CIRCLE_RECTANGLE = 'circle_rectangle'
+    METRICS = 'metrics'
 
 
-class ArticleRequest(BaseModel):
-    """Схема запроса статьи, используется для генерации эндпоинта и классом генерации"""
+class ArticleOptions(BaseModel):
+    """Параметры генерации статьи, не привязанные к конкретному видео"""
     number_of_paragraphs: int = Field(ge=2, default=3)
     number_of_screenshots: int = Field(ge=1, default=3)
-    url: str = Field(regex=_YOUTUBE_REGEX)
-    start: int = Field(ge=0, default=0)
-    end: int = Field(ge=0, default=0)
     force_whisper: bool = False
+    prefetch_audio: bool = False
     selector: SelectorType = SelectorType.UNIFORM
+    decode_mode: DecodeMode = DecodeMode.NATIVE
     image_format: PostrocessorType = PostrocessorType.BASE64
+    transcript_granularity: TranscriptGranularity = TranscriptGranularity.SENTENCE
+    transcript_window: int = Field(ge=1, default=20)
+
+
+class ArticleRequest(ArticleOptions):
+    """
+    Схема запроса статьи, используется для генерации эндпоинта и классом генерации.
+    Видео указывается ссылкой на YouTube или путём к локальному файлу внутри MEDIA_ROOT
+    """
+    url: Optional[str] = Field(default=None, regex=YOUTUBE_REGEX)
+    path: Optional[str] = Field(default=None, regex=_MEDIA_PATH_REGEX)
+    start: int = Field(ge=0, default=0)
+    end: int = Field(ge=0, default=0)
+
+    @root_validator(skip_on_failure=True)
+    def _check_source(cls, values):  # pylint: disable=no-self-argument
+        if bool(values.get('url')) == bool(values.get('path')):
+            raise ValueError('Exactly one of url or path must be provided')
+        return values
+
+    @property
+    def source(self) -> str:
+        return self.url or self.path or ''
+
+
+class BatchArticleRequest(BaseModel):
+    """
+    Схема пакетного запроса статей. Видео можно перечислить явно и/или указать плейлист,
+    тогда для каждого его видео будут использованы параметры из playlist_options
+    """
+    requests: list[ArticleRequest] = []
+    playlist_url: Optional[str] = Field(default=None, regex=_PLAYLIST_REGEX)
+    playlist_options: ArticleOptions = ArticleOptions()
+
+    @root_validator(skip_on_failure=True)
+    def _check_not_empty(cls, values):  # pylint: disable=no-self-argument
+        if not values.get('requests') and not values.get('playlist_url'):
+            raise ValueError('Either requests or playlist_url must be provided')
+        return values
 
 
 class ArticleTopic(BaseModel):
@@ -58,9 +113,71 @@ class GenerationTime(BaseModel):
     content: float = 0
 
 
+class TranscriptCompaction(BaseModel):
+    """Отчёт о сжатии расшифровки перед отправкой языковой модели"""
+    granularity: TranscriptGranularity
+    window: int
+    entries_before: int
+    entries_after: int
+    tokens_before: int
+    tokens_after: int
+
+
 class Article(BaseModel):
     """Сгенерированная статья"""
     title: str
     description: str
     topics: list[ArticleTopic]
     generation_time: GenerationTime
+    transcript_compaction: Optional[TranscriptCompaction] = None
+
+
+class BatchArticleResult(BaseModel):
+    """Результат обработки одного видео из пакетного запроса"""
+    index: int
+    url: Optional[str] = None
+    path: Optional[str] = None
+    article: Optional[Article] = None
+    error: Optional[str] = None
+
+
+class AdmissionStats(BaseModel):
+    """Состояние контроля нагрузки: занятый бюджет, очередь и отклонённые запросы"""
+    memory_used: int
+    memory_budget: int
+    cpu_used: float
+    cpu_budget: float
+    active: int
+    resolving: int
+    queued: int
+    batch_queued: int
+    admitted: int
+    rejected: int
+
+
+class JobStatus(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class Job(BaseModel):
+    """Задание на генерацию статьи в распределённом режиме"""
+    id: str
+    status: JobStatus
+    attempts: int
+    request: ArticleRequest
+    result: Optional[Article] = None
+    error: Optional[str] = None
+
+
+class JobCreated(BaseModel):
+    """Ответ API в распределённом режиме: задание поставлено в очередь"""
+    job_id: str
+    status_url: str
+
+
+class MediaUploaded(BaseModel):
+    """Видео загружено, `path` указывается в запросе статьи вместо ссылки"""
+    path: str
@@ -0,0 +1,210 @@
+from __future__ import annotations
+import asyncio
+import math
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from src.schemas import AdmissionStats, ArticleRequest, DecodeMode, SelectorType
+from src.logger import get_logger
+from .media import MediaCache, MediaFormat, get_local_media_path
+from .video import VideoStream, probe_local_video, resolve_video_stream
+
+
+logger = get_logger()
+# Память на процесс декодирования, буферы ответов модели и прочие накладные расходы
+_BASE_MEMORY = 64 * 1024 * 1024
+# Как часто селекторы сохраняют кадры-кандидаты, None - сохраняются только итоговые кадры
+_CANDIDATE_INTERVALS = {
+    SelectorType.UNIFORM: None,
+    SelectorType.SIMILARITY: 5,
+    SelectorType.CIRCLE_RECTANGLE: 10,
+    SelectorType.METRICS: 5,
+}
+# CamGear декодирует кадры заранее в очередь на 96 кадров (vidgear 0.3.5), а читатель остаётся
+# открытым между темами, поэтому очередь заполнена всё время генерации
+_NATIVE_BUFFER_FRAMES = 96
+
+
+class AdmissionRejected(Exception):
+    """Запрос не может быть принят сейчас, повторить его стоит через `retry_after` секунд"""
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f'Server is busy, retry after {retry_after} seconds')
+        self.retry_after = retry_after
+
+
+@dataclass
+class RequestCost:
+    """Оценка ресурсов, которые займёт генерация одной статьи"""
+    memory: int
+    cpu: float
+
+
+def estimate_cost(request: ArticleRequest, video_stream: VideoStream) -> RequestCost:
+    """
+    Оценивает пиковое потребление памяти и процессора по длительности и разрешению видео.
+    Основную память занимают несжатые кадры-кандидаты одной темы, итоговые изображения
+    и буфер декодирования CamGear для видео с YouTube в режиме NATIVE
+    """
+    duration = max((request.end or video_stream.duration or 0) - request.start, 0)
+    frame_bytes = video_stream.width * video_stream.height * 3
+    candidates = request.number_of_screenshots
+    if interval := _CANDIDATE_INTERVALS[request.selector]:
+        candidates += int(duration / request.number_of_paragraphs / interval)
+    images = request.number_of_paragraphs * request.number_of_screenshots
+    buffered = 0
+    if request.decode_mode == DecodeMode.NATIVE and not request.path:
+        buffered = _NATIVE_BUFFER_FRAMES
+    return RequestCost(
+        memory=_BASE_MEMORY + frame_bytes * (candidates + images + buffered),
+        cpu=1.0 if request.decode_mode == DecodeMode.NATIVE else 0.5,
+    )
+
+
+class AdmissionController:
+    """
+    Ограничивает количество одновременно генерируемых статей общим бюджетом памяти и процессора.
+    Запросы, которые не помещаются в бюджет, ждут в очереди. Если очередь заполнена или ожидание
+    слишком долгое, запрос отклоняется с AdmissionRejected. Видео пакетных запросов ждут
+    без ограничения и считаются отдельно, чтобы большой пакет не закрывал очередь для остальных.
+    Для оценки стоимости видеопоток разрешается не больше чем `resolve_workers` запросами
+    одновременно. При полной очереди запрос отклоняется до разрешения, без обращения к YouTube.
+    Если видео уже есть в `media_cache`, параметры читаются из файла в кэше, также без YouTube
+    """
+    def __init__(
+        self,
+        memory_budget: int,
+        cpu_budget: float,
+        max_queue: int,
+        queue_timeout: float,
+        resolve_workers: int,
+        media_cache: Optional[MediaCache] = None,
+    ) -> None:
+        self.memory_budget = memory_budget
+        self.cpu_budget = cpu_budget
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.media_cache = media_cache
+        self._condition = asyncio.Condition()
+        self._resolve_semaphore = asyncio.Semaphore(resolve_workers)
+        self._resolving = 0
+        self._memory = 0
+        self._cpu = 0.0
+        self._active = 0
+        self._queued = 0
+        self._batch_queued = 0
+        self._admitted = 0
+        self._rejected = 0
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        request: ArticleRequest,
+        wait: bool = False,
+    ) -> AsyncIterator[VideoStream]:
+        """
+        Занимает бюджет на время генерации статьи и отдаёт разрешённый видеопоток, чтобы
+        не разрешать его повторно при чтении кадров. С `wait` запрос ждёт в очереди сколько
+        потребуется и не отклоняется, это используется для пакетной обработки
+        """
+        video_stream = await self._resolve(request, wait)
+        cost = estimate_cost(request, video_stream)
+        # Запрос дороже всего бюджета всё равно должен когда-то выполниться, в одиночку
+        cost.memory = min(cost.memory, self.memory_budget)
+        cost.cpu = min(cost.cpu, self.cpu_budget)
+        logger.debug('Estimated cost for %s: %s', request.source, cost)
+        await self._acquire(cost, wait)
+        try:
+            yield video_stream
+        finally:
+            async with self._condition:
+                self._memory -= cost.memory
+                self._cpu -= cost.cpu
+                self._active -= 1
+                self._condition.notify_all()
+
+    def stats(self) -> AdmissionStats:
+        return AdmissionStats(
+            memory_used=self._memory,
+            memory_budget=self.memory_budget,
+            cpu_used=self._cpu,
+            cpu_budget=self.cpu_budget,
+            active=self._active,
+            resolving=self._resolving,
+            queued=self._queued,
+            batch_queued=self._batch_queued,
+            admitted=self._admitted,
+            rejected=self._rejected,
+        )
+
+    async def _resolve(self, request: ArticleRequest, wait: bool) -> VideoStream:
+        self._check_queue(wait)
+        self._resolving += 1
+        try:
+            async with self._resolve_semaphore:
+                # Пока запрос ждал своей очереди на разрешение, очередь могла заполниться
+                self._check_queue(wait)
+                if request.path:
+                    local_path = get_local_media_path(request.path)
+                    return await run_in_threadpool(probe_local_video, str(local_path))
+                if self.media_cache is not None:
+                    video_stream = await run_in_threadpool(
+                        _probe_cached, self.media_cache, request.source
+                    )
+                    if video_stream is not None:
+                        return video_stream
+                return await run_in_threadpool(resolve_video_stream, request.source)
+        finally:
+            self._resolving -= 1
+
+    def _check_queue(self, wait: bool) -> None:
+        if not wait and self._queued >= self.max_queue:
+            self._reject('queue is full')
+
+    async def _acquire(self, cost: RequestCost, wait: bool) -> None:
+        async with self._condition:
+            if not self._fits(cost):
+                if not wait and self._queued >= self.max_queue:
+                    self._reject('queue is full')
+                self._change_queued(wait, 1)
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(lambda: self._fits(cost)),
+                        None if wait else self.queue_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    self._reject('queue timeout')
+                finally:
+                    self._change_queued(wait, -1)
+            self._memory += cost.memory
+            self._cpu += cost.cpu
+            self._active += 1
+            self._admitted += 1
+
+    def _change_queued(self, wait: bool, delta: int) -> None:
+        if wait:
+            self._batch_queued += delta
+        else:
+            self._queued += delta
+
+    def _fits(self, cost: RequestCost) -> bool:
+        return (
+            self._memory + cost.memory <= self.memory_budget and
+            self._cpu + cost.cpu <= self.cpu_budget
+        )
+
+    def _reject(self, reason: str) -> None:
+        self._rejected += 1
+        logger.warning(
+            'Request rejected (%s): %d active, %d queued, %d batch queued, %d rejected in total',
+            reason, self._active, self._queued, self._batch_queued, self._rejected,
+        )
+        raise AdmissionRejected(retry_after=max(math.ceil(self.queue_timeout), 1))
+
+
+def _probe_cached(media_cache: MediaCache, url: str) -> Optional[VideoStream]:
+    """Читает параметры видео из файла в кэше, None - видео в кэше нет"""
+    with media_cache.peek(url, MediaFormat.VIDEO) as path:
+        return probe_local_video(str(path)) if path is not None else None
@@ -1,23 +1,35 @@
 from __future__ import annotations
 import asyncio
+import threading
 import time
-from datetime import timedelta
-from typing import TYPE_CHECKING, Iterable, Sequence
+from contextlib import ExitStack, nullcontext
+from typing import (
+    TYPE_CHECKING, AsyncIterator, BinaryIO, ContextManager, Optional, Sequence,
+)
 
 from fastapi.concurrency import run_in_threadpool
 from youtube_transcript_api import _errors as youtube_transcript_errors
 
 from src.schemas import Article, ArticleTopic, TranscriptEntry, ArticleRequest, GenerationTime
 from src.logger import get_logger
+from src.settings import AUDIO_PREFETCH_MAX_BYTES, TRANSCRIPT_TOKEN_BUDGET
+from src.utils.json_ import JsonArrayStreamParser, try_loads
+from src.utils.tasks import TaskGroup, gather_or_cancel
 from src.utils.time_ import get_sec
-from .gpt import gpt_json_request, gpt_request
+from .gpt import gpt_request, gpt_stream
+from .media import MediaDownloadCancelled, MediaFormat, get_local_media_path
 from .transcript.youtube import YouTubeTranscriptProvider
 from .transcript.whisper import WhisperTranscriptProvider
-from .screenshots.frame_selector import extract_frames
+from .transcript.compaction import compact_transcript, format_transcript
+from .screenshots.frame_selector import FrameExtractor
 from .screenshots.postprocessor import get_postrocessor
 
 if TYPE_CHECKING:
     from aiohttp import ClientSession
+    from .media import MediaCache
+    from .video import VideoStream
+    from .profiling import RequestProfiler
+    from .scheduler import PipelineScheduler
 
 logger = get_logger()
 PROMPT = """
@@ -74,187 +86,392 @@ class ArticleGenerator:
     def __init__(
         self,
         request: ArticleRequest,
-        session: ClientSession
+        session: ClientSession,
+        scheduler: PipelineScheduler,
+        profiler: Optional[RequestProfiler] = None,
+        media_cache: Optional[MediaCache] = None,
+        video_stream: Optional[VideoStream] = None,
     ) -> None:
         self.request = request
         self.session = session
-        self._article: Article
+        self.scheduler = scheduler
+        self.profiler = profiler
+        self.media_cache = media_cache
+        # Поток, разрешённый контролем нагрузки, переиспользуется при чтении кадров
+        self.video_stream = video_stream
+        self._outline: dict
+        self._outline_time = 0.0
+        self._content_finish_time = 0.0
+        self._cancelled = threading.Event()
 
     async def generate_article(self) -> Article:
         """Выполняет все шаги по генерации статьи и возвращает её"""
         start_time = time.monotonic()
         request = self.request
-        url = request.url
+        url = request.source
 
         logger.info('generating article for %s', url)
         logger.info('gathering transcript for %s', url)
         transcript_generation_start_time = time.monotonic()
-        transcript = await self._get_transacript()
+        async with self.scheduler.transcript:
+            with self._stage('transcript'):
+                transcript = await self._get_transacript()
         transcript_generation_time = time.monotonic() - transcript_generation_start_time
         if request.start or request.end:
             transcript = _truncate_transcript(transcript, request.start, request.end)
+        transcript, compaction_report = compact_transcript(
+            transcript,
+            request.transcript_granularity,
+            request.transcript_window,
+            TRANSCRIPT_TOKEN_BUDGET,
+        )
+        logger.info('transcript compaction for %s: %s', url, compaction_report)
         logger.debug('transcript for %s %s', url, transcript)
 
-        logger.info('generating article title and themes for %s', url)
-        await self._generate_partial_article(transcript)
-        article = self._article
-
-        screenshot_periods = [
-            (get_sec(topic.start), get_sec(topic.end)) for topic in article.topics
-        ]
-        logger.info('gathering frames and generating content for %s', url)
-        logger.debug('Screenshot Periods %s', screenshot_periods)
-        images_start_time = time.monotonic()
-        frames, _ = await asyncio.gather(
-            run_in_threadpool(
-                extract_frames,
-                url,
-                screenshot_periods,
-                request.number_of_screenshots,
-                request.selector,
+        logger.info('generating article title, themes and content for %s', url)
+        # Подтемы приходят из потока ответа модели, каждая сразу отправляется на генерацию
+        # текста и в поток извлечения кадров. Последняя подтема придерживается до конца ответа,
+        # так как для неё нужно знать, что она последняя
+        topics: list[ArticleTopic] = []
+        screenshot_periods: asyncio.Queue[Optional[tuple[int, int]]] = asyncio.Queue()
+        frames_task: Optional[asyncio.Task] = None
+        content_start_time = 0.0
+        previous_topic: Optional[ArticleTopic] = None
+        try:
+            async with TaskGroup() as group:
+                try:
+                    async for topic in self._stream_topics(transcript):
+                        if previous_topic is None:
+                            content_start_time = time.monotonic()
+                            frames_task = group.create_task(
+                                self._extract_frames(screenshot_periods)
+                            )
+                        else:
+                            self._start_topic(
+                                previous_topic, transcript, screenshot_periods, group, False
+                            )
+                        topics.append(topic)
+                        previous_topic = topic
+                    if previous_topic is not None:
+                        self._start_topic(
+                            previous_topic, transcript, screenshot_periods, group, True
+                        )
+                finally:
+                    screenshot_periods.put_nowait(None)
+        except BaseException:
+            self._cancelled.set()
+            raise
+
+        if self.request.number_of_paragraphs != len(topics):
+            logger.warning('Number of topics is not equal to the requested')
+        article = Article(
+            title=self._outline['title'],
+            description=self._outline['description'],
+            topics=topics,
+            generation_time=GenerationTime(
+                title=self._outline_time,
+                content=max(self._content_finish_time - content_start_time, 0),
             ),
-            self._generate_article_content(transcript)
         )
-        article.generation_time.images = time.monotonic() - images_start_time
+        if any(not topic.paragraphs for topic in topics):
+            logger.warning(
+                'Some topics has no paragraphs. This means that the model '
+                'gave the wrong answer, the quality of the article may suffer.'
+            )
+        frames, article.generation_time.images = frames_task.result() if frames_task else ([], 0)
+
         logger.info('process images for %s using %s', url, request.image_format)
         postprocessor = get_postrocessor(request.image_format)()
-        processed_images = await asyncio.gather(
-            *[postprocessor.process_many(topic_frames, self.session) for topic_frames in frames]
-        )
+        with self._stage('postprocess'):
+            processed_images = await gather_or_cancel(
+                *[postprocessor.process_many(topic_frames, self.session) for topic_frames in frames]
+            )
         for topic, processed_topic_frames in zip(article.topics, processed_images):
             topic.images = processed_topic_frames
         article.generation_time.total = time.monotonic() - start_time
         article.generation_time.transcript = transcript_generation_time
+        article.transcript_compaction = compaction_report
         return article
 
     async def _get_transacript(self) -> list[TranscriptEntry]:
-        """Выбирает TranscriptProvider исходя из запроса и запрашивает транскрипцию"""
-        url = self.request.url
+        """
+        Выбирает TranscriptProvider исходя из запроса и запрашивает транскрипцию.
+        Если включена предзагрузка, звук для Whisper загружается параллельно с поиском субтитров
+        и выбрасывается, если субтитры нашлись. Локальные файлы всегда распознаются Whisper
+        """
+        if self.request.path:
+            local_path = get_local_media_path(self.request.path)
+            whisper_provider = WhisperTranscriptProvider(str(local_path), self.session)
+            audio = open(local_path, 'rb')  # pylint: disable=consider-using-with
+            return await whisper_provider.get_transcript(audio)
+
+        url = self.request.source
+        whisper_provider = WhisperTranscriptProvider(url, self.session)
         if self.request.force_whisper:
-            provider = WhisperTranscriptProvider(url, self.session)
-        else:
-            provider = YouTubeTranscriptProvider(url, self.session)
+            return await whisper_provider.get_transcript(
+                await run_in_threadpool(self._download_audio, whisper_provider)
+            )
+
+        prefetch: Optional[asyncio.Task] = None
+        prefetch_cancelled = threading.Event()
+        if self.request.prefetch_audio:
+            prefetch = asyncio.create_task(run_in_threadpool(
+                self._download_audio,
+                whisper_provider,
+                prefetch_cancelled,
+                AUDIO_PREFETCH_MAX_BYTES,
+            ))
+        provider = YouTubeTranscriptProvider(url, self.session)
         try:
             return await provider.get_transcript()
         except youtube_transcript_errors.TranscriptsDisabled:
             logger.info('No transcripts for %s, use whisper fallback', url)
-            provider = WhisperTranscriptProvider(url, self.session)
-            return await provider.get_transcript()
+            audio = None
+            if prefetch is not None:
+                prefetch, audio = None, await prefetch
+            if audio is None:
+                # Предзагрузка не выполнялась или прервана из-за AUDIO_PREFETCH_MAX_BYTES
+                audio = await run_in_threadpool(self._download_audio, whisper_provider)
+            return await whisper_provider.get_transcript(audio)
+        finally:
+            if prefetch is not None:
+                prefetch_cancelled.set()
+                prefetch.add_done_callback(_discard_prefetched_audio)
+
+    def _download_audio(
+        self,
+        whisper_provider: WhisperTranscriptProvider,
+        cancelled: Optional[threading.Event] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Optional[BinaryIO]:
+        """
+        Загружает звук для Whisper через кэш, если он включён, иначе во временный файл.
+        Возвращает None, если загрузка была отменена или превысила `max_bytes`
+        """
+        if self.media_cache is None:
+            return whisper_provider.download_audio(cancelled, max_bytes)
+        try:
+            return self.media_cache.open(
+                self.request.source, MediaFormat.AUDIO, cancelled, max_bytes
+            )
+        except MediaDownloadCancelled as exc:
+            logger.debug('%s', exc)
+            return None
 
-    async def _generate_partial_article(
+    async def _stream_topics(
         self,
         transcript_entries: Sequence[TranscriptEntry],
-    ) -> None:
-        """Генерирует тему и временные промежутки подтем"""
+    ) -> AsyncIterator[ArticleTopic]:
+        """
+        Генерирует тему статьи и отдаёт временные промежутки подтем по мере того, как модель
+        их пишет. Если подтем больше указанного количества, они сразу объединяются
+        """
         start_time = time.monotonic()
-        number_of_paragraphs = self.request.number_of_paragraphs
-        subtitles = _format_transcript(transcript_entries)
-        article_dict = await gpt_json_request(PROMPT, '\n'.join(subtitles), self.session)
-        topics = [ArticleTopic(**topic_data) for topic_data in article_dict['topics']]
-        if number_of_paragraphs < len(topics):
-            number_of_seconds = transcript_entries[-1].start - transcript_entries[0].start
-            approximate_topic_length = number_of_seconds / number_of_paragraphs
-            topics = _recombine_topics(approximate_topic_length, topics)
-        if number_of_paragraphs != len(topics):
-            logger.warning('Number of topics is not equal to the requested')
-
-        self._article = Article(
-            title=article_dict['title'],
-            description=article_dict['description'],
-            topics=topics,
-            generation_time=GenerationTime(title=time.monotonic() - start_time),
+        number_of_seconds = transcript_entries[-1].start - transcript_entries[0].start
+        recombiner = _TopicRecombiner(
+            self.request.number_of_paragraphs,
+            number_of_seconds / self.request.number_of_paragraphs,
+            transcript_entries[-1].start,
         )
-
-    async def _generate_article_content(
+        parser = JsonArrayStreamParser()
+        subtitles = format_transcript(transcript_entries)
+        found_topics = False
+        async with self.scheduler.llm:
+            with self._stage('outline'):
+                async for chunk in gpt_stream(PROMPT, '\n'.join(subtitles), self.session):
+                    for topic_json in parser.feed(chunk):
+                        found_topics = True
+                        for topic in recombiner.feed(ArticleTopic(**try_loads(topic_json))):
+                            yield topic
+        logger.debug('Model response: %s', parser.text)
+        self._outline = try_loads(parser.text)
+        self._outline_time = time.monotonic() - start_time
+        if not found_topics:
+            for topic_data in self._outline['topics']:
+                for topic in recombiner.feed(ArticleTopic(**topic_data)):
+                    yield topic
+        for topic in recombiner.finish():
+            yield topic
+
+    def _start_topic(
         self,
+        topic: ArticleTopic,
         transcript_entries: Sequence[TranscriptEntry],
+        screenshot_periods: asyncio.Queue[Optional[tuple[int, int]]],
+        group: TaskGroup,
+        is_last: bool,
     ) -> None:
-        """Генерирует контент и зоголовок для каждой темы"""
-        start_time = time.monotonic()
-        topics = self._article.topics
-
-        transcript_entries_for_topics = [
-            _select_transcript_entries_for_topic(
-                transcript_entries, topic
-            ) for topic in topics
-        ]
+        """Запускает генерацию текста и извлечение кадров для готовой подтемы"""
+        logger.debug('Starting topic %s - %s', topic.start, topic.end)
+        screenshot_periods.put_nowait((get_sec(topic.start), get_sec(topic.end)))
+        topic_entries = _select_transcript_entries_for_topic(transcript_entries, topic)
         # TODO remove this hack, to do this, rewrite first prompt
-        if all((
-            transcript_entries[-1] not in transcript_entries_for_topics[-1],
-            transcript_entries_for_topics[-1],
-        )):
-            transcript_entries_for_topics[-1].append(transcript_entries[-1])
-
-        logger.debug(
-            'Lenght of transcript: %d before splitting, %d after',
-            len(transcript_entries),
-            sum(len(entry) for entry in transcript_entries_for_topics)
-        )
+        if is_last and topic_entries and transcript_entries[-1] not in topic_entries:
+            topic_entries.append(transcript_entries[-1])
+        if topic_entries:
+            group.create_task(self._generate_topic_content(topic, topic_entries))
 
-        topic_datas = await asyncio.gather(*[
-            gpt_request(
-                TOPIC_PROMPT, '\n'.join(_format_transcript(transcript_entries)), self.session
-            ) for transcript_entries in transcript_entries_for_topics if transcript_entries
-        ])
-        for data, filtered_topics in zip(topic_datas, topics):
-            title, *paragraphs = data.splitlines()
-            if not paragraphs:
-                filtered_topics.title = 'Не удалось сгенерировать'
-                filtered_topics.paragraphs = title
-            else:
-                filtered_topics.title = title
-                filtered_topics.paragraphs = '\n'.join(paragraphs)
-        filtered_topics = list(filter(lambda topic: topic.paragraphs, topics))
-        if len(filtered_topics) != len(topics):
-            logger.warning(
-                'Some topics has no paragraphs so was removed. This means that the model '
-                'gave the wrong answer, the quality of the article may suffer.'
-            )
-        self._article.generation_time.content = time.monotonic() - start_time
+    async def _extract_frames(
+        self,
+        screenshot_periods: asyncio.Queue[Optional[tuple[int, int]]],
+    ) -> tuple[list[list[bytes]], float]:
+        """
+        Извлекает кадры для подтем по мере их поступления, возвращает кадры и время работы.
+        Поток пула занимается только на время обработки промежутка, а не на ожидание следующего
+        """
+        start_time = time.monotonic()
+        frames: list[list[bytes]] = []
+        resources = ExitStack()
+        try:
+            # Загрузка в кэш при промахе идёт в пуле загрузок и не занимает потоки декодирования
+            extractor = await self.scheduler.run_download(self._open_extractor, resources)
+            while extractor is not None and (period := await screenshot_periods.get()) is not None:
+                extract = extractor.extract
+                if self.profiler:
+                    extract = self.profiler.wrap_thread(f'extract_frames-{period[0]}', extract)
+                period_frames = await self.scheduler.run_frames(extract, *period)
+                if extractor.is_cancelled():
+                    logger.info('Frame extraction for %s was cancelled', self.request.source)
+                    break
+                frames.append(period_frames)
+        except BaseException:
+            self._cancelled.set()
+            raise
+        finally:
+            # Поток пула может ещё обрабатывать промежуток, закрытие дождётся его
+            await asyncio.shield(self.scheduler.run_frames(resources.close))
+        return frames, time.monotonic() - start_time
+
+    def _open_extractor(self, resources: ExitStack) -> Optional[FrameExtractor]:
+        """
+        Открывает видео из локального файла, из кэша (загружая его при промахе)
+        или потоком с YouTube, если кэш выключен. Закрыть всё нужно через `resources`.
+        Возвращает None, если загрузка в кэш была отменена
+        """
+        request = self.request
+        video_stream = None
+        # Локальность источника определяется запросом: путь к файлу есть только у `path`
+        # и кэша, а `url` никогда не открывается как файл
+        local = True
+        if request.path:
+            source = str(get_local_media_path(request.path))
+        elif self.media_cache is None:
+            source = request.source
+            video_stream = self.video_stream
+            local = False
+        else:
+            try:
+                path = resources.enter_context(
+                    self.media_cache.use(request.source, MediaFormat.VIDEO, self._cancelled)
+                )
+            except MediaDownloadCancelled:
+                logger.info('Video download for %s was cancelled', request.source)
+                return None
+            source = str(path)
+            # Если контроль нагрузки прочитал параметры из этого же файла кэша
+            if self.video_stream is not None and self.video_stream.url == source:
+                video_stream = self.video_stream
+        extractor = FrameExtractor(
+            source,
+            request.number_of_screenshots,
+            request.selector,
+            request.decode_mode,
+            self._cancelled,
+            video_stream,
+            local,
+        )
+        resources.callback(extractor.close)
+        return extractor
 
+    async def _generate_topic_content(
+        self,
+        topic: ArticleTopic,
+        transcript_entries: Sequence[TranscriptEntry],
+    ) -> None:
+        """Генерирует контент и зоголовок для темы, соблюдая общий лимит запросов к модели"""
+        async with self.scheduler.llm:
+            with self._stage(f'content {topic.start} - {topic.end}'):
+                data = await gpt_request(
+                    TOPIC_PROMPT, '\n'.join(format_transcript(transcript_entries)), self.session
+                )
+        title, *paragraphs = data.splitlines()
+        if not paragraphs:
+            topic.title = 'Не удалось сгенерировать'
+            topic.paragraphs = title
+        else:
+            topic.title = title
+            topic.paragraphs = '\n'.join(paragraphs)
+        self._content_finish_time = time.monotonic()
 
-def _format_transcript(transcript_entries: Iterable[TranscriptEntry]) -> list[str]:
-    """Приводит TranscriptEntry к формату строки, которая будет отправлена языковой модели"""
-    result = []
-    for entry in transcript_entries:
-        start = entry.start
-        text = entry.text
-        result.append(f'{timedelta(seconds=int(start))} - {text}')
-    return result
+    def _stage(self, name: str) -> ContextManager[None]:
+        """Записывает время этапа, если запрос профилируется"""
+        return self.profiler.stage(name) if self.profiler else nullcontext()
 
 
-def _recombine_topics(
-    approximate_topic_length: float,
-    old_topics: list[ArticleTopic]
-) -> list[ArticleTopic]:
+class _TopicRecombiner:
     """
-    Соединяет несколько подтем в одну для достижения указанного количества
+    Соединяет несколько подтем в одну для достижения указанного количества.
+    Пока подтем не больше `number_of_topics`, они придерживаются: объединять их нужно, только
+    если модель вернула больше подтем, чем указано. После этого подтемы объединяются по одной,
+    поэтому объединение работает с потоком ответа модели.
     В теории качество сгенерированных тем не должно пострадать, ведь они будут компиляцией цельных,
     пусть и, возможно, независимых тем
     """
-    last_topic_end = get_sec(old_topics[-1].end)
-    topics = []
-    topic_start_time = old_topics[0].start
-    topic_start_second = get_sec(topic_start_time)
-    for old_topic in old_topics:
-        end_time = get_sec(old_topic.end)
+    def __init__(
+        self,
+        number_of_topics: int,
+        approximate_topic_length: float,
+        last_second: float,
+    ) -> None:
+        self.number_of_topics = number_of_topics
+        self.approximate_topic_length = approximate_topic_length
+        self.last_second = last_second
+        self._pending: list[ArticleTopic] = []
+        self._merging = False
+        self._start: Optional[str] = None
+        self._end: Optional[str] = None
+
+    def feed(self, topic: ArticleTopic) -> list[ArticleTopic]:
+        """Добавляет подтему, возвращает темы, которые уже можно отдавать"""
+        if self._merging:
+            return self._merge(topic)
+        self._pending.append(topic)
+        if len(self._pending) <= self.number_of_topics:
+            return []
+        self._merging = True
+        pending, self._pending = self._pending, []
+        return [merged for pending_topic in pending for merged in self._merge(pending_topic)]
+
+    def finish(self) -> list[ArticleTopic]:
+        """Возвращает придержанные подтемы или оставшуюся после объединения тему"""
+        if not self._merging:
+            pending, self._pending = self._pending, []
+            return pending
+        if self._start is None or self._end is None or self._start == self._end:
+            return []
+        return [ArticleTopic(start=self._start, end=self._end)]
+
+    def _merge(self, topic: ArticleTopic) -> list[ArticleTopic]:
+        if self._start is None:
+            self._start = topic.start
+        self._end = topic.end
+        start_second = get_sec(self._start)
         if (
-            end_time - topic_start_second > approximate_topic_length and
-            last_topic_end - topic_start_second > approximate_topic_length
+            get_sec(topic.end) - start_second >= self.approximate_topic_length and
+            self.last_second - start_second >= self.approximate_topic_length
         ):
-            topics.append(ArticleTopic(
-                start=topic_start_time,
-                end=old_topic.end,
-            ))
-            topic_start_time = old_topic.end
-            topic_start_second = end_time
-    if end_time != topic_start_second:  # type: ignore
-        topics.append(ArticleTopic(
-            start=topic_start_time,
-            end=old_topic.end,  # type: ignore
-        ))
-
-    return topics
+            result = ArticleTopic(start=self._start, end=topic.end)
+            self._start = topic.end
+            return [result]
+        return []
+
+
+def _discard_prefetched_audio(prefetch: asyncio.Task) -> None:
+    """Закрывает временный файл предзагрузки, если он успел загрузиться, но не понадобился"""
+    if prefetch.cancelled():
+        return
+    if prefetch.exception() is None and (audio := prefetch.result()) is not None:
+        audio.close()
 
 
 def _select_transcript_entries_for_topic(
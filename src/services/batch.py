@@ -0,0 +1,98 @@
+from __future__ import annotations
+import asyncio
+from itertools import islice
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Sequence
+
+from fastapi.concurrency import run_in_threadpool
+from pytube import Playlist
+
+from src.schemas import ArticleRequest, BatchArticleRequest, BatchArticleResult
+from src.logger import get_logger
+from .article import ArticleGenerator
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+    from .admission import AdmissionController
+    from .media import MediaCache
+    from .scheduler import PipelineScheduler
+
+
+logger = get_logger()
+
+
+async def expand_batch_request(
+    batch_request: BatchArticleRequest,
+    max_size: int,
+) -> list[ArticleRequest]:
+    """
+    Превращает пакетный запрос в список запросов статей, раскрывая плейлист.
+    Плейлист читается не дальше, чем нужно, чтобы получить `max_size + 1` запрос:
+    этого достаточно, чтобы понять, что пакет слишком большой
+    """
+    requests = list(batch_request.requests)
+    if batch_request.playlist_url and len(requests) <= max_size:
+        video_urls = await run_in_threadpool(
+            _get_playlist_urls, batch_request.playlist_url, max_size + 1 - len(requests)
+        )
+        logger.info('playlist %s: took %d videos', batch_request.playlist_url, len(video_urls))
+        options = batch_request.playlist_options.dict()
+        requests.extend(ArticleRequest(url=url, **options) for url in video_urls)
+    return requests
+
+
+async def generate_articles(
+    requests: Sequence[ArticleRequest],
+    session: ClientSession,
+    scheduler: PipelineScheduler,
+    admission: AdmissionController,
+    media_cache: Optional[MediaCache] = None,
+) -> AsyncIterator[BatchArticleResult]:
+    """
+    Генерирует статьи для всех запросов и отдаёт их по мере готовности.
+    Этапы всех статей выполняются через общий планировщик, поэтому нагрузка ограничена
+    настройками воркеров, а не размером пакета. Видео пакета ждут своей очереди в контроле
+    нагрузки, но не отклоняются им
+    """
+    tasks = [
+        asyncio.create_task(
+            _generate_one(index, request, session, scheduler, admission, media_cache)
+        )
+        for index, request in enumerate(requests)
+    ]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _generate_one(
+    index: int,
+    request: ArticleRequest,
+    session: ClientSession,
+    scheduler: PipelineScheduler,
+    admission: AdmissionController,
+    media_cache: Optional[MediaCache],
+) -> BatchArticleResult:
+    try:
+        async with admission.admit(request, wait=True) as video_stream:
+            generator = ArticleGenerator(
+                request=request,
+                session=session,
+                scheduler=scheduler,
+                media_cache=media_cache,
+                video_stream=video_stream,
+            )
+            article = await generator.generate_article()
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception('article generation for %s failed', request.source)
+        return BatchArticleResult(
+            index=index, url=request.url, path=request.path, error=repr(exc)
+        )
+    return BatchArticleResult(index=index, url=request.url, path=request.path, article=article)
+
+
+def _get_playlist_urls(playlist_url: str, limit: int) -> list[str]:
+    """Первые `limit` видео плейлиста, следующие страницы плейлиста не загружаются"""
+    return list(islice(Playlist(playlist_url).video_urls, limit))
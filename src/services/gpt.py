@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, AsyncIterator
 import io
 import json
 
@@ -14,13 +14,13 @@ if TYPE_CHECKING:
 logger = get_logger()
 
 
-async def gpt_request(
+async def gpt_stream(
     system: str,
     user: str,
     session: ClientSession,
-) -> str:
+) -> AsyncIterator[str]:
     """
-    Далает запрос на указанный в .env url и возвращает полный ответ
+    Далает запрос на указанный в .env url и отдаёт части ответа по мере их получения
     Использованные параменты не обязательно оптимальные, перед массовым использованием лучше
     подобрать temperature и top_p исходя из качества ответов
     """
@@ -47,7 +47,6 @@ async def gpt_request(
         'Accept': 'text/event-stream',
     }
 
-    buffer = io.StringIO()
     async with session.post(PATH, headers=headers, json=payload) as response:
         async for event in response.content:
             if event == b'\n' or not event or event == b'data: [DONE]\n':
@@ -58,8 +57,18 @@ async def gpt_request(
                 logger.warning('Broken event from model: %s', event)
                 raise
             if delta := resp_dict['choices'][0]['delta']:
-                content = delta['content']
-                buffer.write(content)
+                yield delta['content']
+
+
+async def gpt_request(
+    system: str,
+    user: str,
+    session: ClientSession,
+) -> str:
+    """Далает запрос на указанный в .env url и возвращает полный ответ"""
+    buffer = io.StringIO()
+    async for content in gpt_stream(system=system, user=user, session=session):
+        buffer.write(content)
     content = buffer.getvalue()
     logger.debug('Model response: %s', content)
     return content
@@ -0,0 +1,214 @@
+from __future__ import annotations
+import fcntl
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from enum import Enum
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+import yt_dlp
+
+from src.logger import get_logger
+from src.settings import MEDIA_ROOT
+from src.utils.youtube import get_video_id
+from .video import VIDEO_FORMAT
+
+
+logger = get_logger()
+_UPLOADS_DIR = 'uploads'
+_UPLOAD_EXTENSION_REGEX = re.compile(r'^\.\w{1,10}$')
+_LOCK_POLL_INTERVAL = 0.1
+
+
+class MediaFormat(str, Enum):
+    VIDEO = 'video'
+    AUDIO = 'audio'
+
+
+class MediaDownloadCancelled(Exception):
+    """Загрузка в кэш была отменена"""
+
+
+def get_local_media_path(path: str) -> Path:
+    """Путь к локальному файлу внутри MEDIA_ROOT. Пути, ведущие за пределы MEDIA_ROOT, запрещены"""
+    root = Path(MEDIA_ROOT).resolve()
+    local_path = (root / path).resolve()
+    if not local_path.is_relative_to(root):
+        raise ValueError(f'Media path {path} is outside of media root')
+    if not local_path.is_file():
+        raise FileNotFoundError(f'Media file {path} not found')
+    return local_path
+
+
+def create_upload_path(file_name: str) -> tuple[str, Path]:
+    """Выбирает имя для загружаемого файла, возвращает путь относительно MEDIA_ROOT и полный путь"""
+    extension = os.path.splitext(file_name)[1].lower()
+    if not _UPLOAD_EXTENSION_REGEX.match(extension):
+        extension = ''
+    relative_path = f'{_UPLOADS_DIR}/{uuid.uuid4().hex}{extension}'
+    full_path = Path(MEDIA_ROOT) / relative_path
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    return relative_path, full_path
+
+
+class MediaCache:
+    """
+    Кэш загруженных с YouTube видео и звуковых дорожек на диске, ключ - id видео и формат.
+    Общий размер ограничен `max_bytes`, при переполнении удаляются давно не использованные файлы
+    (время использования - mtime файла). Файлы, которые сейчас читаются, не удаляются.
+    Каталог может быть общим для нескольких процессов (API и воркеры на одном томе), поэтому
+    всё согласуется блокировками flock на файлах рядом с файлом кэша: `.<ключ>.download`
+    не даёт загружать один файл дважды, а разделяемая блокировка `.<ключ>.use` держится,
+    пока файл используется, и удаление пропускает такие файлы.
+    Вызовы блокирующие, выполнять их нужно в потоке
+    """
+    _FORMATS = {
+        MediaFormat.VIDEO: VIDEO_FORMAT,
+        MediaFormat.AUDIO: 'bestaudio[ext=m4a]/bestaudio',
+    }
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._evict()
+
+    @contextmanager
+    def use(
+        self,
+        url: str,
+        media_format: MediaFormat,
+        cancelled: Optional[threading.Event] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Iterator[Path]:
+        """
+        Отдаёт путь к файлу, загружая его при отсутствии в кэше.
+        Пока контекст открыт, файл не будет удалён из кэша ни одним процессом.
+        Загрузка файла больше `max_bytes` прерывается с MediaDownloadCancelled
+        """
+        key = self._key(url, media_format)
+        path = self.directory / key
+        with self._lock_file(key, 'use') as use_lock:
+            with self._lock_file(key, 'download') as download_lock:
+                _flock(download_lock, fcntl.LOCK_EX, cancelled)
+                # Удаление берёт исключительную блокировку только без ожидания,
+                # поэтому здесь ждать долго не придётся
+                _flock(use_lock, fcntl.LOCK_SH, cancelled)
+                if path.is_file():
+                    os.utime(path)
+                    logger.debug('Media cache hit for %s', key)
+                else:
+                    self._download(url, media_format, path, cancelled, max_bytes)
+            self._evict()
+            yield path
+
+    @contextmanager
+    def peek(self, url: str, media_format: MediaFormat) -> Iterator[Optional[Path]]:
+        """
+        Отдаёт путь к файлу, только если он уже есть в кэше, ничего не загружая.
+        Пока контекст открыт, файл не будет удалён из кэша
+        """
+        key = self._key(url, media_format)
+        path = self.directory / key
+        with self._lock_file(key, 'use') as use_lock:
+            _flock(use_lock, fcntl.LOCK_SH, None)
+            yield path if path.is_file() else None
+
+    def open(
+        self,
+        url: str,
+        media_format: MediaFormat,
+        cancelled: Optional[threading.Event] = None,
+        max_bytes: Optional[int] = None,
+    ) -> BinaryIO:
+        """Открывает файл из кэша. Открытый файл остаётся доступен, даже если кэш его удалит"""
+        with self.use(url, media_format, cancelled, max_bytes) as path:
+            return open(path, 'rb')  # pylint: disable=consider-using-with
+
+    def _download(
+        self,
+        url: str,
+        media_format: MediaFormat,
+        path: Path,
+        cancelled: Optional[threading.Event],
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        """Загружает файл во временный файл рядом и атомарно переименовывает"""
+        def check_cancelled(progress: dict) -> None:
+            if cancelled is not None and cancelled.is_set():
+                raise yt_dlp.utils.DownloadCancelled('cancelled')
+            if max_bytes is not None and (progress.get('downloaded_bytes') or 0) > max_bytes:
+                raise yt_dlp.utils.DownloadCancelled(f'exceeds {max_bytes} bytes')
+
+        temporary_path = self.directory / f'.{path.name}-{uuid.uuid4().hex}'
+        options = {
+            'format': self._FORMATS[media_format],
+            'outtmpl': str(temporary_path),
+            'quiet': True,
+            'noplaylist': True,
+            'progress_hooks': [check_cancelled],
+        }
+        logger.info('Downloading %s of %s to media cache', media_format.value, url)
+        try:
+            with yt_dlp.YoutubeDL(options) as ydl:
+                ydl.download([url])
+            os.replace(temporary_path, path)
+        except yt_dlp.utils.DownloadCancelled as exc:
+            raise MediaDownloadCancelled(f'Download of {url} stopped: {exc.msg}') from exc
+        finally:
+            for leftover in self.directory.glob(f'{temporary_path.name}*'):
+                leftover.unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """
+        Удаляет давно не использованные файлы, пока кэш не поместится в `max_bytes`.
+        Файлы может одновременно удалять другой процесс, пропавшие файлы пропускаются
+        """
+        files = []
+        for path in self.directory.iterdir():
+            if path.name.startswith('.'):
+                continue
+            try:
+                files.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        total = sum(stat.st_size for stat, _ in files)
+        files.sort(key=lambda file: file[0].st_mtime)
+        for stat, path in files:
+            if total <= self.max_bytes:
+                break
+            with self._lock_file(path.name, 'use') as use_lock:
+                try:
+                    fcntl.flock(use_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if path.is_file():
+                    logger.info('Evicting %s from media cache', path.name)
+                    path.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    def _lock_file(self, key: str, kind: str) -> BinaryIO:
+        """
+        Открывает файл блокировки. Блокировка снимается при закрытии файла.
+        Файлы блокировок не удаляются: иначе процессы могли бы заблокировать разные файлы
+        """
+        return open(self.directory / f'.{key}.{kind}', 'a+b')  # pylint: disable=consider-using-with
+
+    def _key(self, url: str, media_format: MediaFormat) -> str:
+        return f'{get_video_id(url)}-{media_format.value}'
+
+
+def _flock(file: BinaryIO, operation: int, cancelled: Optional[threading.Event]) -> None:
+    """Ждёт блокировку, проверяя `cancelled`, чтобы отменённый запрос не ждал чужую загрузку"""
+    while True:
+        if cancelled is not None and cancelled.is_set():
+            raise MediaDownloadCancelled('Waiting for media cache lock was cancelled')
+        try:
+            fcntl.flock(file, operation | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(_LOCK_POLL_INTERVAL)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import functools
+import json
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+
+from src.logger import get_logger
+from src.settings import PROFILING_DIR, PROFILING_INTERVAL
+
+
+logger = get_logger()
+T = TypeVar('T')
+
+
+class RequestProfiler:
+    """
+    Профилирование одного запроса. Сэмплирующий профайлер (pyinstrument) записывает
+    корутину генерации и функции, выполняемые в потоках, а время каждого этапа пишется отдельно.
+    Все файлы сохраняются в отдельную папку запроса внутри PROFILING_DIR.
+    Экземпляр создаётся только для профилируемых запросов, остальные не несут накладных расходов
+    """
+    def __init__(self) -> None:
+        self.name = f'{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+        self.directory = get_profile_path(self.name)
+        self._start_time = time.monotonic()
+        self._stages: list[dict[str, Any]] = []
+
+    @asynccontextmanager
+    async def profile(self, name: str) -> AsyncIterator[None]:
+        """Профилирует асинхронный блок, включая время ожидания в await"""
+        profiler = _create_profiler(async_mode='enabled')
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            # Файлы speedscope бывают большими, их отрисовка и запись не должны занимать цикл событий
+            await run_in_threadpool(self._save, name, profiler)
+            await run_in_threadpool(self._save_stages)
+
+    def wrap_thread(self, name: str, func: Callable[..., T]) -> Callable[..., T]:
+        """Оборачивает функцию, чтобы профилировать её выполнение в потоке пула"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> T:
+            profiler = _create_profiler(async_mode='disabled')
+            profiler.start()
+            try:
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            finally:
+                profiler.stop()
+                self._save(name, profiler)
+        return wrapper
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Записывает время начала и длительность этапа"""
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self._stages.append({
+                'stage': name,
+                'thread': threading.current_thread().name,
+                'start': start_time - self._start_time,
+                'duration': time.monotonic() - start_time,
+            })
+
+    def _save(self, name: str, profiler) -> None:
+        # pylint: disable-next=import-outside-toplevel
+        from pyinstrument.renderers import SpeedscopeRenderer
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f'{name}.speedscope.json'
+        path.write_text(profiler.output(SpeedscopeRenderer()), encoding='utf-8')
+        logger.info('Profile saved to %s', path)
+
+    def _save_stages(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stages = sorted(self._stages, key=lambda stage: stage['start'])
+        (self.directory / 'stages.json').write_text(json.dumps(stages, indent=2), encoding='utf-8')
+
+
+def get_profile_path(name: str, file_name: str = '') -> Path:
+    return Path(PROFILING_DIR) / name / file_name
+
+
+def check_profiling_available() -> None:
+    """Проверяет при запуске, что pyinstrument установлен, чтобы не падать на первом запросе"""
+    try:
+        import pyinstrument  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError as exc:
+        raise RuntimeError(
+            'Profiling requires pyinstrument, install it with `poetry install -E profiling`'
+        ) from exc
+
+
+def _create_profiler(async_mode: str):
+    from pyinstrument import Profiler  # pylint: disable=import-outside-toplevel
+    return Profiler(interval=PROFILING_INTERVAL, async_mode=async_mode)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+
+T = TypeVar('T')
+
+
+class PipelineScheduler:
+    """
+    Общие ограниченные пулы для этапов генерации статей.
+
+    Один экземпляр разделяется между всеми запросами, поэтому пакетная обработка и параллельные
+    запросы не порождают неограниченное число обращений к языковой модели и потоков декодирования
+    видео: количество одновременно выполняемых этапов определяется настройками
+    """
+    def __init__(
+        self,
+        transcript_workers: int,
+        llm_workers: int,
+        frame_workers: int,
+        download_workers: int,
+    ) -> None:
+        self.transcript = asyncio.Semaphore(transcript_workers)
+        self.llm = asyncio.Semaphore(llm_workers)
+        self._frames_executor = ThreadPoolExecutor(
+            max_workers=frame_workers,
+            thread_name_prefix='frames',
+        )
+        # Загрузка видео в кэш может идти минутами, поэтому у неё свой пул, а не пул кадров
+        self._downloads_executor = ThreadPoolExecutor(
+            max_workers=download_workers,
+            thread_name_prefix='downloads',
+        )
+
+    async def run_frames(self, func: Callable[..., T], *args: Any) -> T:
+        """Выполняет функцию в общем пуле потоков для работы с кадрами"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._frames_executor, functools.partial(func, *args))
+
+    async def run_download(self, func: Callable[..., T], *args: Any) -> T:
+        """Выполняет функцию в общем пуле потоков для загрузки видео"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._downloads_executor, functools.partial(func, *args)
+        )
+
+    def shutdown(self) -> None:
+        self._frames_executor.shutdown(wait=False, cancel_futures=True)
+        self._downloads_executor.shutdown(wait=False, cancel_futures=True)
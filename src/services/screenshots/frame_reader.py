@@ -0,0 +1,182 @@
+from __future__ import annotations
+import queue
+import re
+import threading
+from abc import abstractmethod, ABC
+from typing import IO, Iterator, Optional
+
+import cv2
+import ffmpeg
+import numpy as np
+from vidgear.gears import CamGear
+
+from src.schemas import DecodeMode
+from src.logger import get_logger
+from src.settings import DECODE_FPS
+from ..video import VideoStream, resolve_video_stream
+
+
+logger = get_logger()
+_PTS_TIME_REGEX = re.compile(r'Parsed_showinfo.*pts_time:\s*(-?[\d.]+)')
+_PTS_TIMEOUT = 30
+
+
+def get_frame_reader(decode_mode: DecodeMode, local: bool = False) -> type[FrameReader]:
+    if local and decode_mode == DecodeMode.NATIVE:
+        return LocalFrameReader
+    readers_mapping = {
+        DecodeMode.NATIVE: NativeFrameReader,
+        DecodeMode.KEYFRAMES: KeyframeFrameReader,
+        DecodeMode.LOW_FPS: LowFpsFrameReader,
+    }
+    return readers_mapping[decode_mode]
+
+
+class FrameReader(ABC):
+    """
+    Читает кадры видео вместе с секундой, на которой они находятся.
+    Уже разрешённый видеопоток можно передать в `video_stream`, чтобы не разрешать его повторно.
+    Без него `url` считается ссылкой на YouTube
+    """
+    def __init__(self, url: str, start: int, video_stream: Optional[VideoStream] = None) -> None:
+        self.url = url
+        self.start = start
+        self.video_stream = video_stream
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[tuple[cv2.Mat, int]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class NativeFrameReader(FrameReader):
+    """Декодирует все кадры с исходной частотой, время вычисляется по номеру кадра"""
+
+    def __init__(self, url: str, start: int, video_stream: Optional[VideoStream] = None) -> None:
+        super().__init__(url, start, video_stream)
+        # Прямую ссылку на поток CamGear открывает сам, без повторного запроса к YouTube
+        self._stream = CamGear(
+            source=video_stream.url if video_stream else url,  # type: ignore
+            stream_mode=video_stream is None,
+            time_delay=1,
+        ).start()
+
+    def __iter__(self) -> Iterator[tuple[cv2.Mat, int]]:
+        currentframe = 0
+        while True:
+            frame = self._stream.read()
+            currentframe += 1
+            if frame is None:
+                return
+            yield frame, int(currentframe // self._stream.framerate)
+
+    def close(self) -> None:
+        self._stream.stop()
+
+
+class LocalFrameReader(FrameReader):
+    """
+    Декодирует все кадры локального файла, сразу перематывая к `start`.
+    Время кадров берётся из позиции в файле
+    """
+
+    def __init__(self, url: str, start: int, video_stream: Optional[VideoStream] = None) -> None:
+        super().__init__(url, start, video_stream)
+        self._capture = cv2.VideoCapture(url)
+        if not self._capture.isOpened():
+            raise ValueError(f'Can not open video {url}')
+        self._capture.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+
+    def __iter__(self) -> Iterator[tuple[cv2.Mat, int]]:
+        while True:
+            success, frame = self._capture.read()
+            if not success:
+                return
+            yield frame, int(self._capture.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+
+    def close(self) -> None:
+        self._capture.release()
+
+
+class FFmpegFrameReader(FrameReader):
+    """
+    Декодирует только часть кадров средствами ffmpeg, начиная с `start`.
+    Время кадров берётся из PTS потока (фильтр showinfo), а не вычисляется по номеру кадра
+    """
+
+    def __init__(self, url: str, start: int, video_stream: Optional[VideoStream] = None) -> None:
+        super().__init__(url, start, video_stream)
+        video_stream = video_stream or resolve_video_stream(url)
+        self._frame_shape = (video_stream.height, video_stream.width, 3)
+        stream = ffmpeg.input(video_stream.url, ss=start, **self._input_options())
+        stream = self._filter(stream).filter('showinfo')
+        self._process = stream.output(
+            'pipe:',
+            format='rawvideo',
+            pix_fmt='bgr24',
+            copyts=None,
+            **self._output_options(),
+        ).global_args('-hide_banner', '-nostats').run_async(pipe_stdout=True, pipe_stderr=True)
+        self._timestamps: queue.Queue[Optional[float]] = queue.Queue()
+        self._stderr_thread = threading.Thread(
+            target=self._read_timestamps,
+            args=(self._process.stderr,),
+            daemon=True,
+        )
+        self._stderr_thread.start()
+
+    def _input_options(self) -> dict:
+        return {}
+
+    def _output_options(self) -> dict:
+        return {}
+
+    def _filter(self, stream):
+        return stream
+
+    def __iter__(self) -> Iterator[tuple[cv2.Mat, int]]:
+        frame_size = int(np.prod(self._frame_shape))
+        while True:
+            data = self._process.stdout.read(frame_size)
+            if len(data) < frame_size:
+                return
+            try:
+                pts_time = self._timestamps.get(timeout=_PTS_TIMEOUT)
+            except queue.Empty:
+                logger.warning('No timestamp for frame of %s, stopping', self.url)
+                return
+            if pts_time is None:
+                return
+            frame = np.frombuffer(data, np.uint8).reshape(self._frame_shape)
+            yield frame, int(pts_time)
+
+    def _read_timestamps(self, stderr: IO[bytes]) -> None:
+        for line in stderr:
+            if match := _PTS_TIME_REGEX.search(line.decode(errors='replace')):
+                self._timestamps.put(float(match[1]))
+        self._timestamps.put(None)
+
+    def close(self) -> None:
+        self._process.kill()
+        self._process.wait()
+        self._stderr_thread.join()
+
+
+class KeyframeFrameReader(FFmpegFrameReader):
+    """Декодирует только ключевые кадры, остальные декодер пропускает"""
+
+    def _input_options(self) -> dict:
+        return {'skip_frame': 'nokey'}
+
+    def _output_options(self) -> dict:
+        return {'vsync': 'passthrough'}
+
+
+class LowFpsFrameReader(FFmpegFrameReader):
+    """Отдаёт кадры с фиксированной низкой частотой `DECODE_FPS`"""
+
+    def _filter(self, stream):
+        return stream.filter('fps', fps=DECODE_FPS)
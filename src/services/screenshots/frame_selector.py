@@ -1,12 +1,16 @@
 from __future__ import annotations
+import threading
 from abc import abstractmethod, ABC
-from typing import Sequence
+from typing import Iterator, Optional
 
 import cv2
-from vidgear.gears import CamGear
+import numpy as np
 
-from src.schemas import SelectorType
+from src.schemas import DecodeMode, SelectorType
 from src.logger import get_logger
+from .frame_reader import FrameReader, get_frame_reader
+from .scoring import score_frames, select_best
+from ..video import VideoStream, probe_local_video
 
 
 logger = get_logger()
@@ -17,6 +21,7 @@ def get_selector(selector_type: SelectorType) -> type[FrameSelector]:
         SelectorType.UNIFORM: UniformSelector,
         SelectorType.SIMILARITY: SimilaritySelector,
         SelectorType.CIRCLE_RECTANGLE: CircleRectangleSelecor,
+        SelectorType.METRICS: MetricsSelector,
     }
     return selectors_mapping[selector_type]
 
@@ -59,11 +64,12 @@ class UniformSelector(FrameSelector):
         self._to_save = [first + seconds_per_screenshot*n for n in range(screenshots_count)]
 
     def feed(self, frame: cv2.Mat, second: int) -> None:
-        if all((
-            second in self._to_save,
-            second not in self._saved
-        )):
-            self._saved[second] = frame
+        # Кадры могут идти с пропусками (только ключевые или с низкой частотой),
+        # поэтому сохраняется первый кадр не раньше нужной секунды
+        for to_save in self._to_save:
+            if to_save <= second and to_save not in self._saved:
+                self._saved[to_save] = frame
+                break
 
     def get_result(self) -> list[cv2.Mat]:
         return list(self._saved.values())
@@ -134,7 +140,8 @@ class CircleRectangleSelecor(FrameSelector):
         circles = cv2.HoughCircles(gray_frame, cv2.HOUGH_GRADIENT, 1.2, 100)
         rectangles = cv2.findContours(thresh_frame, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         rectangles = rectangles[0] if len(rectangles) == 2 else rectangles[1]
-        self._candidates.append((circles.shape[2] + len(rectangles), frame))
+        circles_count = circles.shape[1] if circles is not None else 0
+        self._candidates.append((circles_count + len(rectangles), frame))
         self._last_second = second
 
     def get_result(self) -> list[cv2.Mat]:
@@ -143,45 +150,117 @@ class CircleRectangleSelecor(FrameSelector):
         return [candidate[1] for candidate in candidates[:self.screenshots_count]]
 
 
-def extract_frames(
-    url: str,
-    screenshot_periods: Sequence[tuple[int, int]],
-    number_of_screenshots: int,
-    selector_type: SelectorType,
-) -> list[list[bytes]]:
-    selector_class = get_selector(selector_type)
-    stream = CamGear(
-        source=url,  # type: ignore
-        stream_mode=True,
-        time_delay=1,
-    ).start()
-
-    currentframe = 0
-    second = 0
-    frames = []
-    for start, end in screenshot_periods:
-        logger.debug('Creating new selector, start=%d, end=%d, frame=%d, second=%d',
-                     start, end, currentframe, second)
-        selector = selector_class(number_of_screenshots, start, end)
-        period_screenshots = []
-
-        while True:
-            frame = stream.read()
-            currentframe += 1
-            if frame is None:
-                break
+class MetricsSelector(FrameSelector):
+    """
+    Вибирает скриншоты по метрикам информативности: плотности краёв, энтропии, резкости
+    и стабильности изображения. Кадры-кандидаты уменьшаются и оцениваются одной пачкой
+    векторизованно, почти одинаковые кадры отбрасываются
+    """
+    _INTERVAL = 5
+    _SCORING_WIDTH = 160
 
-            second = int(currentframe // stream.framerate)
-            selector.feed(frame, second)
+    def __init__(
+        self,
+        screenshots_count: int,
+        start: int,
+        end: int
+    ) -> None:
+        super().__init__(screenshots_count, start, end)
+        self._frames: list[cv2.Mat] = []
+        self._small_frames: list[np.ndarray] = []
+        self._last_second = 0
+
+    def feed(self, frame: cv2.Mat, second: int) -> None:
+        if self._frames and second - self._last_second <= self._INTERVAL:
+            return
+
+        height, width = frame.shape[:2]
+        scoring_size = (self._SCORING_WIDTH, max(int(height * self._SCORING_WIDTH / width), 1))
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._small_frames.append(cv2.resize(gray_frame, scoring_size, interpolation=cv2.INTER_AREA))
+        self._frames.append(frame)
+        self._last_second = second
+
+    def get_result(self) -> list[cv2.Mat]:
+        if not self._frames:
+            return []
+        scores, hists = score_frames(np.stack(self._small_frames))
+        logger.debug(scores)
+        selected = select_best(scores, hists, self.screenshots_count)
+        return [self._frames[index] for index in sorted(selected)]
 
-            if second > end:
-                break
 
-        result = selector.get_result()
-        for frame in result:
-            _, buffer = cv2.imencode('.png', frame)
-            period_screenshots.append(buffer.tobytes())
-        frames.append(period_screenshots)
+class FrameExtractor:
+    """
+    Извлекает кадры для промежутков видео, читая его одним потоком.
+    Промежутки передаются по одному: между вызовами `extract` поток видео остаётся открытым,
+    но поток пула не занимается, поэтому промежутки можно передавать по мере их появления.
+    Если установлено событие `cancelled`, чтение прекращается.
+    `video_stream` - уже разрешённый поток `url`, если он есть.
+    `local` указывает, что `url` - проверенный путь к файлу на диске, а не ссылка на YouTube
+    """
+    def __init__(
+        self,
+        url: str,
+        number_of_screenshots: int,
+        selector_type: SelectorType,
+        decode_mode: DecodeMode = DecodeMode.NATIVE,
+        cancelled: Optional[threading.Event] = None,
+        video_stream: Optional[VideoStream] = None,
+        local: bool = False,
+    ) -> None:
+        self.url = url
+        self.number_of_screenshots = number_of_screenshots
+        self.decode_mode = decode_mode
+        self.cancelled = cancelled
+        self.video_stream = video_stream
+        self.local = local
+        self._selector_class = get_selector(selector_type)
+        self._reader: Optional[FrameReader] = None
+        self._video_frames: Iterator[tuple[cv2.Mat, int]] = iter(())
+        self._second = 0
+        # extract и close могут вызываться из разных потоков пула
+        self._lock = threading.Lock()
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled is not None and self.cancelled.is_set()
+
+    def extract(self, start: int, end: int) -> list[bytes]:
+        """Выбирает кадры промежутка, видео открывается с начала первого промежутка"""
+        with self._lock:
+            if self._reader is None:
+                if self.local and self.video_stream is None:
+                    self.video_stream = probe_local_video(self.url)
+                self._reader = get_frame_reader(self.decode_mode, self.local)(
+                    self.url, start, self.video_stream
+                )
+                self._video_frames = iter(self._reader)
+            logger.debug(
+                'Creating new selector, start=%d, end=%d, second=%d', start, end, self._second
+            )
+            selector = self._selector_class(self.number_of_screenshots, start, end)
+            while not self.is_cancelled():
+                if (video_frame := next(self._video_frames, None)) is None:
+                    break
+
+                frame, self._second = video_frame
+                selector.feed(frame, self._second)
+
+                if self._second > end:
+                    break
+
+            if self.is_cancelled():
+                return []
+            period_screenshots = []
+            for frame in selector.get_result():
+                _, buffer = cv2.imencode('.png', frame)
+                period_screenshots.append(buffer.tobytes())
+            return period_screenshots
+
+    def close(self) -> None:
+        """Закрывает поток видео, дождавшись текущего вызова `extract`"""
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
 
-    stream.stop()
-    return frames
@@ -2,11 +2,11 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 import base64
-import asyncio
 
 from src.logger import get_logger
 from src.schemas import PostrocessorType
 from src.settings import IMGUR_TOKEN, IMGUR_ID
+from src.utils.tasks import gather_or_cancel
 if TYPE_CHECKING:
     from aiohttp import ClientSession
 
@@ -29,7 +29,7 @@ class Postrocessor(ABC):
         raise NotImplementedError
 
     async def process_many(self, images: list[bytes], session: ClientSession) -> list[str]:
-        return await asyncio.gather(
+        return await gather_or_cancel(
             *[self.process(image, session) for image in images]
         )
 
@@ -0,0 +1,93 @@
+"""
+Векторизованные метрики информативности кадров.
+Все функции принимают пачку кадров в оттенках серого формы (N, H, W) с типом uint8
+и возвращают по одному значению на кадр
+"""
+import numpy as np
+
+
+_EDGE_THRESHOLD = 32
+_DUPLICATE_DISTANCE = 0.05
+
+
+def histograms(frames: np.ndarray) -> np.ndarray:
+    """Нормированные гистограммы яркости формы (N, 256)"""
+    count = frames.shape[0]
+    offsets = (np.arange(count, dtype=np.int64) * 256)[:, None]
+    values = frames.reshape(count, -1).astype(np.int64) + offsets
+    hists = np.bincount(values.ravel(), minlength=count * 256).reshape(count, 256)
+    return hists / hists.sum(axis=1, keepdims=True)
+
+
+def entropy(hists: np.ndarray) -> np.ndarray:
+    """Энтропия Шеннона гистограмм, у однотонных кадров близка к нулю"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.nansum(hists * np.log2(hists), axis=1)
+
+
+def edge_density(frames: np.ndarray) -> np.ndarray:
+    """Доля пикселей с сильным перепадом яркости: текст, схемы и интерфейсы дают много краёв"""
+    frames = frames.astype(np.int16)
+    horizontal = np.abs(np.diff(frames, axis=2))[:, :-1, :] > _EDGE_THRESHOLD
+    vertical = np.abs(np.diff(frames, axis=1))[:, :, :-1] > _EDGE_THRESHOLD
+    return (horizontal | vertical).mean(axis=(1, 2))
+
+
+def sharpness(frames: np.ndarray) -> np.ndarray:
+    """Дисперсия лапласиана, у размытых кадров (переходы, движение) она низкая"""
+    frames = frames.astype(np.float32)
+    laplacian = (
+        frames[:, :-2, 1:-1] + frames[:, 2:, 1:-1] +
+        frames[:, 1:-1, :-2] + frames[:, 1:-1, 2:] -
+        4 * frames[:, 1:-1, 1:-1]
+    )
+    return laplacian.var(axis=(1, 2))
+
+
+def bhattacharyya_distances(hists: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Попарные расстояния Бхаттачарии между гистограммами формы (N, M)"""
+    return _bhattacharyya_distance(np.sqrt(hists) @ np.sqrt(others).T)
+
+
+def paired_bhattacharyya_distances(hists: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Расстояния Бхаттачарии между гистограммами с одинаковыми индексами формы (N,)"""
+    return _bhattacharyya_distance(np.sum(np.sqrt(hists * others), axis=1))
+
+
+def _bhattacharyya_distance(coefficients: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.clip(1 - coefficients, 0, None))
+
+
+def score_frames(frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Оценивает информативность кадров. Возвращает оценки и гистограммы.
+    Метрики нормируются внутри пачки, к ним добавляется стабильность: кадры, сильно отличающиеся
+    от предыдущего, чаще оказываются переходами
+    """
+    hists = histograms(frames)
+    change = np.zeros(len(frames))
+    if len(frames) > 1:
+        change[1:] = paired_bhattacharyya_distances(hists[1:], hists[:-1])
+    metrics = np.stack([
+        edge_density(frames),
+        entropy(hists),
+        sharpness(frames),
+        -change,
+    ])
+    std = metrics.std(axis=1, keepdims=True)
+    normalized = (metrics - metrics.mean(axis=1, keepdims=True)) / np.where(std > 0, std, 1)
+    return normalized.sum(axis=0), hists
+
+
+def select_best(scores: np.ndarray, hists: np.ndarray, count: int) -> list[int]:
+    """Индексы лучших по оценке кадров без почти одинаковых"""
+    selected: list[int] = []
+    for index in np.argsort(-scores):
+        if len(selected) == count:
+            break
+        if selected and bhattacharyya_distances(
+            hists[index:index + 1], hists[selected]
+        ).min() < _DUPLICATE_DISTANCE:
+            continue
+        selected.append(int(index))
+    return selected
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import math
+from datetime import timedelta
+from typing import Iterable, Sequence
+
+from src.schemas import TranscriptEntry, TranscriptGranularity, TranscriptCompaction
+
+
+_SENTENCE_ENDINGS = ('.', '!', '?', '…')
+# Темы длятся не меньше минуты, более длинные строки мешают модели выбирать их границы
+_MAX_WINDOW = 60
+
+
+def format_transcript(transcript_entries: Iterable[TranscriptEntry]) -> list[str]:
+    """Приводит TranscriptEntry к формату строки, которая будет отправлена языковой модели"""
+    result = []
+    for entry in transcript_entries:
+        start = entry.start
+        text = entry.text
+        result.append(f'{timedelta(seconds=int(start))} - {text}')
+    return result
+
+
+def estimate_tokens(lines: Iterable[str]) -> int:
+    """
+    Приблизительно оценивает количество токенов в строках промпта.
+    Точный токенизатор не используется, оценка по байтам UTF-8 учитывает, что кириллица
+    занимает больше токенов, чем латиница
+    """
+    return sum(math.ceil(len(line.encode('utf-8')) / 4) + 1 for line in lines)
+
+
+def compact_transcript(
+    transcript_entries: Sequence[TranscriptEntry],
+    granularity: TranscriptGranularity,
+    window: int,
+    token_budget: int,
+) -> tuple[list[TranscriptEntry], TranscriptCompaction]:
+    """
+    Объединяет соседние фрагменты расшифровки в более длинные строки, чтобы метки времени
+    не занимали большую часть токенов промпта.
+    Фрагменты объединяются до конца предложения (для `sentence`) или до истечения окна в `window`
+    секунд. Если результат не укладывается в `token_budget`, окно увеличивается вдвое, пока
+    расшифровка не поместится или окно не достигнет минуты
+    """
+    tokens_before = estimate_tokens(format_transcript(transcript_entries))
+    result = list(transcript_entries)
+    if granularity != TranscriptGranularity.RAW and transcript_entries:
+        result = _merge_entries(transcript_entries, granularity, window)
+        while estimate_tokens(format_transcript(result)) > token_budget and window < _MAX_WINDOW:
+            window = min(window * 2, _MAX_WINDOW)
+            result = _merge_entries(transcript_entries, granularity, window)
+
+    report = TranscriptCompaction(
+        granularity=granularity,
+        window=window,
+        entries_before=len(transcript_entries),
+        entries_after=len(result),
+        tokens_before=tokens_before,
+        tokens_after=estimate_tokens(format_transcript(result)),
+    )
+    return result, report
+
+
+def _merge_entries(
+    transcript_entries: Sequence[TranscriptEntry],
+    granularity: TranscriptGranularity,
+    window: int,
+) -> list[TranscriptEntry]:
+    result = []
+    texts: list[str] = []
+    start = end = transcript_entries[0].start
+    for entry in transcript_entries:
+        if texts and entry.start - start >= window:
+            result.append(_join(texts, start, end))
+            texts = []
+        if not texts:
+            start = entry.start
+        texts.append(entry.text)
+        end = entry.start + entry.duration
+        if granularity == TranscriptGranularity.SENTENCE and entry.text.rstrip().endswith(
+            _SENTENCE_ENDINGS
+        ):
+            result.append(_join(texts, start, end))
+            texts = []
+    if texts:
+        result.append(_join(texts, start, end))
+    return result
+
+
+def _join(texts: list[str], start: float, end: float) -> TranscriptEntry:
+    return TranscriptEntry(' '.join(' '.join(texts).split()), start, end - start)
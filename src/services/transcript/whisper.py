@@ -1,39 +1,69 @@
-import io
 import json
+import tempfile
+import threading
+from typing import BinaryIO, Optional
 
-from pytube import YouTube
+from fastapi.concurrency import run_in_threadpool
+from pytube import YouTube, request as pytube_request
 
 from src.schemas import TranscriptEntry
+from src.logger import get_logger
 from .transcript_provider_abc import TranscriptProvider
 
 
+logger = get_logger()
+
+
 class WhisperTranscriptProvider(TranscriptProvider):
     """Получает расшифровку используя модель Whisper"""
 
-    async def get_transcript(self) -> list[TranscriptEntry]:
-        buffer = self._get_audio_buffer()
-        whisper_response = await self._whisper_request(buffer.read())
+    async def get_transcript(self, audio: Optional[BinaryIO] = None) -> list[TranscriptEntry]:
+        """Распознаёт речь видео. Заранее загруженный звук можно передать в `audio`"""
+        if audio is None:
+            audio = await run_in_threadpool(self.download_audio)
+        with audio:
+            whisper_response = await self._whisper_request(audio)
         return [TranscriptEntry(
             segment['text'],
             segment['start'],
             segment['end'] - segment['start'],
         ) for segment in whisper_response['segments']]
 
-    def _get_audio_buffer(self) -> io.BytesIO:
-        buffer = io.BytesIO()
-        if stream := YouTube(self.url).streams.filter(
+    def download_audio(
+        self,
+        cancelled: Optional[threading.Event] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Optional[BinaryIO]:
+        """
+        Загружает звуковую дорожку видео во временный файл.
+        Возвращает None, если загрузка была отменена через `cancelled` или файл превысил `max_bytes`
+        """
+        stream = YouTube(self.url).streams.filter(
             only_audio=True
-        ).filter(file_extension="mp4").first():
-            stream.stream_to_buffer(buffer)
-            buffer.seek(0)
-            return buffer
+        ).filter(file_extension="mp4").first()
+        if not stream:
+            raise ValueError(f'Video {self.url} has no audio stream')
 
-        raise ValueError(f'Video {self.url} has no audio stream')
+        audio = tempfile.TemporaryFile()
+        downloaded = 0
+        for chunk in pytube_request.stream(stream.url):
+            downloaded += len(chunk)
+            if cancelled is not None and cancelled.is_set():
+                logger.debug('Audio download for %s was cancelled', self.url)
+                audio.close()
+                return None
+            if max_bytes is not None and downloaded > max_bytes:
+                logger.info('Audio for %s exceeds %d bytes, download stopped', self.url, max_bytes)
+                audio.close()
+                return None
+            audio.write(chunk)
+        audio.seek(0)
+        return audio
 
-    async def _whisper_request(self, buffer: bytes):
+    async def _whisper_request(self, audio: BinaryIO):
         async with self.session.post(
             'http://whisper:9000/asr?encode=true&output=json',
-            data={'audio_file': buffer},
+            data={'audio_file': audio},
         ) as response:
             resp = await response.text()
         return json.loads(resp)
@@ -1,46 +1,125 @@
+from __future__ import annotations
+import asyncio
+import html
+import json
 import re
+from dataclasses import dataclass
+from typing import Optional
+from xml.etree import ElementTree
 
-import youtube_transcript_api
-from fastapi.concurrency import run_in_threadpool
+from aiohttp import ClientError, ClientTimeout
+from youtube_transcript_api import _errors as youtube_transcript_errors
 
 from src.schemas import TranscriptEntry
 from src.logger import get_logger
+from src.settings import YOUTUBE_TIMEOUT
+from src.utils.youtube import get_video_id
 from .transcript_provider_abc import TranscriptProvider
 
 
 logger = get_logger()
 
 
+@dataclass
+class CaptionTrack:
+    """Доступные для видео субтитры на одном языке"""
+    url: str
+    language_code: str
+    is_generated: bool
+
+
 class YouTubeTranscriptProvider(TranscriptProvider):
-    """Получает расшифровку с YouTube"""
+    """
+    Получает расшифровку с YouTube.
+    Запросы выполняются через общую сессию aiohttp, без потоков и отдельных соединений
+    """
 
-    _YOUTUBE_REGEX = r'^.*(youtu\.be\/|v\/|u\/\w\/|embed\/|watch\?v=|\&v=)([^#\&\?]*).*'
-    _transcript_api = youtube_transcript_api.YouTubeTranscriptApi()
+    _WATCH_URL = 'https://www.youtube.com/watch?v={video_id}'
+    _CONSENT_ACTION = 'action="https://consent.youtube.com/s"'
+    _HEADERS = {'Accept-Language': 'en-US'}
 
     async def get_transcript(self) -> list[TranscriptEntry]:
         transcript = self._best_transcript(await self._get_transcripts())
-        transcript_data = await run_in_threadpool(transcript.fetch)
-        return [TranscriptEntry(**entry) for entry in transcript_data]
+        transcript_xml = await self._get_text(transcript.url)
+        return self._parse_transcript(transcript_xml)
+
+    async def _get_transcripts(self) -> list[CaptionTrack]:
+        video_id = get_video_id(self.url)
+        watch_url = self._WATCH_URL.format(video_id=video_id)
+        page = await self._get_text(watch_url)
+        if self._CONSENT_ACTION in page:
+            page = await self._get_text(watch_url, self._consent_cookie(page, video_id))
+            if self._CONSENT_ACTION in page:
+                raise youtube_transcript_errors.FailedToCreateConsentCookie(video_id)
+        return self._extract_caption_tracks(page, video_id)
+
+    async def _get_text(self, url: str, cookies: Optional[dict[str, str]] = None) -> str:
+        try:
+            async with self.session.get(
+                url,
+                headers=self._HEADERS,
+                cookies=cookies,
+                timeout=ClientTimeout(total=YOUTUBE_TIMEOUT),
+                raise_for_status=True,
+            ) as response:
+                return await response.text()
+        except (ClientError, asyncio.TimeoutError) as error:
+            # При превышении ClientTimeout aiohttp выбрасывает asyncio.TimeoutError, а не ClientError
+            raise youtube_transcript_errors.YouTubeRequestFailed(
+                get_video_id(self.url),
+                str(error) or f'No response in {YOUTUBE_TIMEOUT} seconds',
+            ) from error
+
+    @staticmethod
+    def _consent_cookie(page: str, video_id: str) -> dict[str, str]:
+        if match := re.search('name="v" value="(.*?)"', page):
+            return {'CONSENT': f'YES+{match[1]}'}
+        raise youtube_transcript_errors.FailedToCreateConsentCookie(video_id)
+
+    @staticmethod
+    def _extract_caption_tracks(page: str, video_id: str) -> list[CaptionTrack]:
+        """Достаёт список субтитров из страницы видео так же, как youtube_transcript_api"""
+        page = html.unescape(page)
+        splitted_page = page.split('"captions":')
+        if len(splitted_page) <= 1:
+            if 'class="g-recaptcha"' in page:
+                raise youtube_transcript_errors.TooManyRequests(video_id)
+            if '"playabilityStatus":' not in page:
+                raise youtube_transcript_errors.VideoUnavailable(video_id)
+            raise youtube_transcript_errors.TranscriptsDisabled(video_id)
+
+        captions = json.loads(
+            splitted_page[1].split(',"videoDetails')[0].replace('\n', '')
+        ).get('playerCaptionsTracklistRenderer')
+        if captions is None:
+            raise youtube_transcript_errors.TranscriptsDisabled(video_id)
+        if 'captionTracks' not in captions:
+            raise youtube_transcript_errors.NoTranscriptAvailable(video_id)
 
-    def _youtuble_url_to_video_id(self) -> str:
-        if match := re.match(pattern=self._YOUTUBE_REGEX, string=self.url):
-            return match[2]
-        raise ValueError('Invalid youtube video URL')
+        return [CaptionTrack(
+            url=caption['baseUrl'],
+            language_code=caption['languageCode'],
+            is_generated=caption.get('kind', '') == 'asr',
+        ) for caption in captions['captionTracks']]
 
-    async def _get_transcripts(self) -> youtube_transcript_api.TranscriptList:
-        video_id = self._youtuble_url_to_video_id()
-        return await run_in_threadpool(self._transcript_api.list_transcripts, video_id)
+    @staticmethod
+    def _parse_transcript(transcript_xml: str) -> list[TranscriptEntry]:
+        return [TranscriptEntry(
+            re.sub(r'<[^>]*>', '', html.unescape(element.text)),
+            float(element.attrib['start']),
+            float(element.attrib.get('dur', '0.0')),
+        ) for element in ElementTree.fromstring(transcript_xml) if element.text is not None]
 
     def _best_transcript(
         self,
-        transcripts: youtube_transcript_api.TranscriptList,
-    ) -> youtube_transcript_api.Transcript:
+        transcripts: list[CaptionTrack],
+    ) -> CaptionTrack:
         best_langueges = [
             'ru', 'en', 'es', 'fr', 'de', 'it', 'pt', 'nl',
             'sv', 'da', 'no', 'fi', 'ru', 'ar', 'ja', 'ko', 'zh'
         ]
 
-        def max_key(transcript: youtube_transcript_api.Transcript):
+        def max_key(transcript: CaptionTrack):
             language_code = transcript.language_code
             if language_code in best_langueges:
                 return -best_langueges.index(language_code) - transcript.is_generated
@@ -0,0 +1,54 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import yt_dlp
+
+
+VIDEO_FORMAT = 'bestvideo[ext=mp4][height<=1080]/best[ext=mp4]/best'
+
+
+@dataclass
+class VideoStream:
+    """Прямая ссылка на видеопоток и его параметры"""
+    url: str
+    width: int
+    height: int
+    fps: Optional[float]
+    duration: Optional[float]
+
+
+def resolve_video_stream(url: str) -> VideoStream:
+    """Получает прямую ссылку на видеопоток YouTube без загрузки самого видео"""
+    with yt_dlp.YoutubeDL({'format': VIDEO_FORMAT, 'quiet': True, 'noplaylist': True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    return VideoStream(
+        url=info['url'],
+        width=info['width'],
+        height=info['height'],
+        fps=info.get('fps'),
+        duration=info.get('duration'),
+    )
+
+
+def probe_local_video(path: str) -> VideoStream:
+    """
+    Читает параметры локального файла. Путь должен быть уже проверен,
+    например через `get_local_media_path`: здесь он никак не ограничивается
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f'Can not open video {path}')
+        fps = capture.get(cv2.CAP_PROP_FPS) or None
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        return VideoStream(
+            url=path,
+            width=int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            height=int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            fps=fps,
+            duration=frame_count / fps if fps and frame_count > 0 else None,
+        )
+    finally:
+        capture.release()
@@ -13,3 +13,40 @@ if not TOKEN or not PATH:
 
 IMGUR_ID = os.getenv('IMGUR_CLIENT_ID') or ''
 IMGUR_TOKEN = os.getenv('IMGUR_TOKEN') or ''
+
+TRANSCRIPT_WORKERS = int(os.getenv('TRANSCRIPT_WORKERS') or 4)
+LLM_WORKERS = int(os.getenv('LLM_WORKERS') or 8)
+FRAME_WORKERS = int(os.getenv('FRAME_WORKERS') or 2)
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS') or 4)
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE') or 50)
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv('TRANSCRIPT_TOKEN_BUDGET') or 12000)
+DISCONNECT_POLL_INTERVAL = float(os.getenv('DISCONNECT_POLL_INTERVAL') or 1)
+DECODE_FPS = float(os.getenv('DECODE_FPS') or 1)
+YOUTUBE_TIMEOUT = float(os.getenv('YOUTUBE_TIMEOUT') or 30)
+AUDIO_PREFETCH_MAX_BYTES = int(os.getenv('AUDIO_PREFETCH_MAX_BYTES') or 200 * 1024 * 1024)
+ADMISSION_MEMORY_MB = int(os.getenv('ADMISSION_MEMORY_MB') or 2048)
+ADMISSION_CPU = float(os.getenv('ADMISSION_CPU') or os.cpu_count() or 1)
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE') or 20)
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT') or 60)
+ADMISSION_RESOLVE_WORKERS = int(os.getenv('ADMISSION_RESOLVE_WORKERS') or 4)
+# off - профилирование выключено, header - по заголовку X-Profile: 1, always - для всех запросов
+PROFILING = os.getenv('PROFILING') or 'off'
+PROFILING_DIR = os.getenv('PROFILING_DIR') or 'profiles'
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL') or 0.001)
+# local - статьи генерируются в процессе API, api - API только ставит задания в очередь воркерам
+DEPLOYMENT_MODE = os.getenv('DEPLOYMENT_MODE') or 'local'
+# sqlite - файл на одном узле, redis - общий сервер Redis для воркеров на разных узлах
+JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND') or 'sqlite'
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH') or 'jobs.db'
+JOB_QUEUE_URL = os.getenv('JOB_QUEUE_URL') or 'redis://localhost:6379/0'
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL') or 10)
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv('JOB_HEARTBEAT_TIMEOUT') or 60)
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS') or 3)
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY') or 1)
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL') or 1)
+# Локальные видео для запросов с path и загруженные через /media/
+MEDIA_ROOT = os.getenv('MEDIA_ROOT') or 'media'
+MEDIA_UPLOAD_MAX_MB = int(os.getenv('MEDIA_UPLOAD_MAX_MB') or 2048)
+# Кэш загруженных с YouTube видео и звука, 0 - кэш выключен и видео читается потоком
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR') or 'media_cache'
+MEDIA_CACHE_MAX_MB = int(os.getenv('MEDIA_CACHE_MAX_MB') or 0)
@@ -1,5 +1,16 @@
+import asyncio
+import io
 import json
 import contextlib
+from typing import Any, AsyncIterator, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 def try_loads(json_string: str):
@@ -22,3 +33,111 @@ def try_loads(json_string: str):
     with contextlib.suppress(json.JSONDecodeError):
         return json.loads(json_string.rstrip('}'))
     return json.loads(json_string.rstrip(']'))
+
+
+class JsonArrayStreamParser:
+    """
+    Инкрементально выделяет объекты из массивов верхнего объекта JSON, который приходит по частям.
+    Например, из `{"topics": [{...}, {...}]}` каждый `{...}` будет возвращён, как только модель
+    допишет его закрывающую скобку. Весь полученный текст сохраняется в `text`
+    """
+    _ITEM_STACK = ['{', '[']
+
+    def __init__(self) -> None:
+        self._buffer = io.StringIO()
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._item: Optional[io.StringIO] = None
+
+    @property
+    def text(self) -> str:
+        return self._buffer.getvalue()
+
+    def feed(self, chunk: str) -> list[str]:
+        """Добавляет часть ответа, возвращает тексты объектов, которые в ней завершились"""
+        self._buffer.write(chunk)
+        items = []
+        for char in chunk:
+            if self._item is not None:
+                self._item.write(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if char == '{' and self._stack == self._ITEM_STACK:
+                    self._item = io.StringIO(char)
+                    self._item.seek(1)
+                self._stack.append(char)
+            elif char in '}]' and self._stack:
+                self._stack.pop()
+                if self._item is not None and self._stack == self._ITEM_STACK:
+                    items.append(self._item.getvalue())
+                    self._item = None
+        return items
+
+
+def dumps(obj: Any) -> bytes:
+    """Сериализует объект в JSON, используя orjson, если он установлен"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def iter_dumps(obj: Any, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Сериализует объект в JSON по частям размером около `chunk_size`.
+    Длинные строки (например, изображения в base64) пишутся кусками, поэтому весь ответ
+    никогда не собирается в памяти целиком
+    """
+    buffer = bytearray()
+    for part in _iter_parts(obj, chunk_size):
+        buffer += part
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def aiter_dumps(obj: Any, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Асинхронная обёртка над `iter_dumps` для StreamingResponse. Синхронный генератор Starlette
+    перебирает в пуле потоков, по переходу на каждую часть, а сериализация части быстрее такого
+    перехода, поэтому части готовятся прямо в цикле событий, уступая его между ними
+    """
+    for chunk in iter_dumps(obj, chunk_size):
+        yield chunk
+        await asyncio.sleep(0)
+
+
+def _iter_parts(obj: Any, chunk_size: int) -> Iterator[bytes]:
+    if isinstance(obj, dict):
+        yield b'{'
+        for index, (key, value) in enumerate(obj.items()):
+            if index:
+                yield b','
+            yield dumps(key)
+            yield b':'
+            yield from _iter_parts(value, chunk_size)
+        yield b'}'
+    elif isinstance(obj, (list, tuple)):
+        yield b'['
+        for index, value in enumerate(obj):
+            if index:
+                yield b','
+            yield from _iter_parts(value, chunk_size)
+        yield b']'
+    elif isinstance(obj, str) and len(obj) > chunk_size:
+        yield b'"'
+        for start in range(0, len(obj), chunk_size):
+            yield dumps(obj[start:start + chunk_size])[1:-1]
+        yield b'"'
+    else:
+        yield dumps(obj)
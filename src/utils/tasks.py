@@ -0,0 +1,74 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Coroutine, Optional, TypeVar
+
+
+T = TypeVar('T')
+
+
+class TaskGroup:
+    """
+    Упрощённый аналог asyncio.TaskGroup из Python 3.11.
+    При выходе из блока дожидается всех задач. Первая же ошибка одной из задач сразу отменяет
+    остальные задачи и сам блок, после чего блок завершается этой ошибкой. Если сам блок
+    завершился ошибкой или был отменён, задачи тоже отменяются, чтобы не тратить ресурсы впустую
+    """
+    def __init__(self) -> None:
+        self._tasks: list[asyncio.Task] = []
+        self._cancelled_tasks: set[asyncio.Task] = set()
+        self._parent: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+        self._parent_cancelled = False
+        self._exiting = False
+
+    def create_task(self, coro: Coroutine[Any, Any, T]) -> asyncio.Task[T]:
+        task = asyncio.create_task(coro)
+        task.add_done_callback(self._on_task_done)
+        self._tasks.append(task)
+        return task
+
+    async def __aenter__(self) -> TaskGroup:
+        self._parent = asyncio.current_task()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        try:
+            if exc_type is None:
+                await asyncio.gather(*self._tasks)
+        except BaseException:  # pylint: disable=broad-except
+            if self._error is None:
+                raise
+        finally:
+            self._exiting = True
+            self._cancel_tasks()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._error is not None and (
+            exc_type is None or issubclass(exc_type, asyncio.CancelledError)
+        ):
+            # Отмену блока вызвала ошибка задачи, наружу выходит сама ошибка
+            if self._parent_cancelled and hasattr(self._parent, 'uncancel'):
+                self._parent.uncancel()  # type: ignore
+            raise self._error
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is None or self._error is not None:
+            return
+        self._error = task.exception()
+        self._cancel_tasks()
+        if self._parent is not None and not self._exiting:
+            self._parent_cancelled = True
+            self._parent.cancel()
+
+    def _cancel_tasks(self) -> None:
+        # Повторная отмена прервала бы задачи, которые освобождают ресурсы после первой
+        for task in self._tasks:
+            if task not in self._cancelled_tasks:
+                self._cancelled_tasks.add(task)
+                task.cancel()
+
+
+async def gather_or_cancel(*coros: Coroutine[Any, Any, T]) -> list[T]:
+    """Как asyncio.gather, но при ошибке одной из корутин отменяет остальные"""
+    async with TaskGroup() as group:
+        tasks = [group.create_task(coro) for coro in coros]
+    return [task.result() for task in tasks]
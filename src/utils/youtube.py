@@ -0,0 +1,11 @@
+import re
+
+
+YOUTUBE_REGEX = r'^.*(youtu\.be\/|v\/|u\/\w\/|embed\/|watch\?v=|\&v=)([^#\&\?]*).*'
+
+
+def get_video_id(url: str) -> str:
+    """Выделяет id видео из ссылки на YouTube"""
+    if match := re.match(pattern=YOUTUBE_REGEX, string=url):
+        return match[2]
+    raise ValueError('Invalid youtube video URL')
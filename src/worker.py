@@ -0,0 +1,88 @@
+"""
+Воркер распределённого режима: забирает задания из очереди и генерирует статьи.
+Запуск: `python -m src.worker`, воркеров можно запускать сколько угодно. С очередью Redis
+(`JOB_QUEUE_BACKEND=redis`) - на любых узлах, у которых есть доступ к серверу Redis,
+с очередью SQLite - только на том же узле, что и API
+"""
+import asyncio
+import os
+import socket
+from logging.config import dictConfig
+
+from fastapi.concurrency import run_in_threadpool
+
+from .dependencies import http_client, pipeline_scheduler, job_queue, media_cache
+from .jobs.job_queue_abc import JobQueue
+from .schemas import Job
+from .services.article import ArticleGenerator
+from .services.scheduler import PipelineScheduler
+from .settings import JOB_HEARTBEAT_INTERVAL, WORKER_CONCURRENCY, WORKER_POLL_INTERVAL
+from .logger import LogConfig, get_logger
+from .utils.pytube_hotfix import fix
+
+
+logger = get_logger()
+
+
+async def _run_job(
+    job: Job,
+    worker_id: str,
+    queue: JobQueue,
+    scheduler: PipelineScheduler,
+) -> None:
+    """Генерирует статью, продлевая задание, пока работа идёт"""
+    generator = ArticleGenerator(
+        request=job.request, session=http_client(), scheduler=scheduler, media_cache=media_cache()
+    )
+    task = asyncio.create_task(generator.generate_article())
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=JOB_HEARTBEAT_INTERVAL)
+            if done:
+                break
+            if not await run_in_threadpool(queue.heartbeat, job.id, worker_id):
+                logger.warning('Job %s was taken by another worker, cancelling', job.id)
+                return
+        article = task.result()
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception('Job %s failed', job.id)
+        await run_in_threadpool(queue.fail, job.id, worker_id, repr(exc))
+        return
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    await run_in_threadpool(queue.complete, job.id, worker_id, article)
+    logger.info('Job %s done', job.id)
+
+
+async def _worker_loop(worker_id: str, queue: JobQueue, scheduler: PipelineScheduler) -> None:
+    while True:
+        job = await run_in_threadpool(queue.claim, worker_id)
+        if job is None:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+        logger.info('Worker %s took job %s (attempt %d)', worker_id, job.id, job.attempts)
+        await _run_job(job, worker_id, queue, scheduler)
+
+
+async def run_worker() -> None:
+    worker_id = f'{socket.gethostname()}-{os.getpid()}'
+    http_client.start()
+    pipeline_scheduler.start()
+    job_queue.start()
+    media_cache.start()
+    logger.info('Worker %s started with %d slots', worker_id, WORKER_CONCURRENCY)
+    try:
+        await asyncio.gather(*[
+            _worker_loop(f'{worker_id}-{slot}', job_queue(), pipeline_scheduler())
+            for slot in range(WORKER_CONCURRENCY)
+        ])
+    finally:
+        pipeline_scheduler.stop()
+        await http_client.stop()
+
+
+if __name__ == '__main__':
+    dictConfig(LogConfig().dict())
+    fix()
+    asyncio.run(run_worker())
@@ -0,0 +1,6 @@
+import os
+
+
+# Настройки читаются при импорте src.settings и без них он падает
+os.environ.setdefault('API_TOKEN', 'test')
+os.environ.setdefault('API_ENDPOINT', 'http://localhost')
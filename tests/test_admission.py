@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from src.schemas import ArticleRequest
+from src.services import admission
+from src.services.admission import AdmissionController, AdmissionRejected
+from src.services.media import MediaCache
+from src.services.video import VideoStream
+
+
+REQUEST = ArticleRequest(url='https://youtu.be/abc')
+
+
+class _Resolver:
+    """Заменяет yt-dlp: считает вызовы и одновременные разрешения"""
+    def __init__(self, delay: float = 0) -> None:
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url: str) -> VideoStream:
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        return VideoStream(url=f'{url}/direct', width=640, height=360, fps=30, duration=600)
+
+
+def _controller(monkeypatch, resolver: _Resolver, **options) -> AdmissionController:
+    monkeypatch.setattr(admission, 'resolve_video_stream', resolver)
+    settings = {
+        'memory_budget': 1024 ** 3,
+        'cpu_budget': 1,
+        'max_queue': 2,
+        'queue_timeout': 1,
+        'resolve_workers': 2,
+    }
+    settings.update(options)
+    return AdmissionController(**settings)
+
+
+def test_admit_yields_resolved_stream(monkeypatch):
+    resolver = _Resolver()
+    controller = _controller(monkeypatch, resolver)
+
+    async def run():
+        async with controller.admit(REQUEST) as video_stream:
+            return video_stream
+
+    assert asyncio.run(run()).url == 'https://youtu.be/abc/direct'
+    assert resolver.calls == 1
+
+
+def test_full_queue_rejects_without_resolving(monkeypatch):
+    resolver = _Resolver()
+    controller = _controller(monkeypatch, resolver, max_queue=1)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit(REQUEST):
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert controller.stats().queued == 1
+        with pytest.raises(AdmissionRejected):
+            async with controller.admit(REQUEST):
+                pass
+        release.set()
+        await asyncio.gather(*holders)
+
+    asyncio.run(run())
+    assert resolver.calls == 2
+    assert controller.stats().rejected == 1
+
+
+def test_resolves_are_bounded(monkeypatch):
+    resolver = _Resolver(delay=0.05)
+    controller = _controller(monkeypatch, resolver, cpu_budget=100, resolve_workers=2)
+
+    async def run():
+        async def one():
+            async with controller.admit(REQUEST, wait=True):
+                pass
+
+        await asyncio.gather(*[one() for _ in range(8)])
+
+    asyncio.run(run())
+    assert resolver.calls == 8
+    assert resolver.max_running == 2
+
+
+def test_batch_waiters_do_not_fill_interactive_queue(monkeypatch):
+    resolver = _Resolver()
+    controller = _controller(monkeypatch, resolver, max_queue=2)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold(wait: bool):
+            async with controller.admit(REQUEST, wait=wait):
+                await release.wait()
+
+        batch = [asyncio.create_task(hold(True)) for _ in range(10)]
+        await asyncio.sleep(0.05)
+        assert controller.stats().batch_queued == 9
+        assert controller.stats().queued == 0
+        interactive = [asyncio.create_task(hold(False)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert controller.stats().queued == 2
+        with pytest.raises(AdmissionRejected):
+            async with controller.admit(REQUEST):
+                pass
+        release.set()
+        await asyncio.gather(*batch, *interactive)
+
+    asyncio.run(run())
+    assert controller.stats().rejected == 1
+    assert controller.stats().admitted == 12
+
+
+def test_native_cost_includes_decode_buffer():
+    video_stream = VideoStream(url='', width=1920, height=1080, fps=30, duration=600)
+    frame_bytes = 1920 * 1080 * 3
+    native = admission.estimate_cost(ArticleRequest(url='https://youtu.be/abc'), video_stream)
+    low_fps = admission.estimate_cost(
+        ArticleRequest(url='https://youtu.be/abc', decode_mode='low_fps'), video_stream,
+    )
+    local = admission.estimate_cost(ArticleRequest(path='clip.mp4'), video_stream)
+    assert native.memory - low_fps.memory == 96 * frame_bytes
+    assert local.memory == low_fps.memory
+
+
+def test_url_is_never_opened_as_file(monkeypatch, tmp_path):
+    # Такой путь проходит проверку ссылки на YouTube, но файл вне MEDIA_ROOT открываться не должен
+    video_path = tmp_path / 'v' / 'clip.mp4'
+    video_path.parent.mkdir()
+    video_path.write_bytes(b'')
+    monkeypatch.setattr(admission, 'probe_local_video', pytest.fail)
+    resolver = _Resolver()
+    controller = _controller(monkeypatch, resolver)
+
+    async def run():
+        async with controller.admit(ArticleRequest(url=str(video_path))) as video_stream:
+            return video_stream
+
+    assert asyncio.run(run()).url == f'{video_path}/direct'
+    assert resolver.calls == 1
+
+
+def test_cached_video_is_probed_without_resolving(monkeypatch, tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1024 ** 3)
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    writer = cv2.VideoWriter(str(tmp_path / '.clip.mp4'), fourcc, 10, (64, 48))
+    for _ in range(20):
+        writer.write(np.zeros((48, 64, 3), np.uint8))
+    writer.release()
+    (tmp_path / '.clip.mp4').rename(tmp_path / 'abc-video')
+    resolver = _Resolver()
+    controller = _controller(monkeypatch, resolver, media_cache=cache)
+
+    async def run(request: ArticleRequest):
+        async with controller.admit(request) as video_stream:
+            return video_stream
+
+    video_stream = asyncio.run(run(REQUEST))
+    assert video_stream.url == str(tmp_path / 'abc-video')
+    assert (video_stream.width, video_stream.height, video_stream.duration) == (64, 48, 2)
+    assert resolver.calls == 0
+    asyncio.run(run(ArticleRequest(url='https://youtu.be/def')))
+    assert resolver.calls == 1
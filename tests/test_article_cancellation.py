@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from src.schemas import ArticleRequest, TranscriptEntry
+from src.services import article
+from src.services.article import ArticleGenerator
+from src.services.scheduler import PipelineScheduler
+
+
+OUTLINE_START = '{"title": "T", "description": "D", "topics": ['
+TOPIC = '{"start": "0:%02d:00", "end": "0:%02d:00"}, '
+
+
+class _Extractor:
+    closed = False
+
+    def __init__(self, url, *options):
+        self.cancelled = options[3]
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled.is_set()
+
+    def extract(self, start: int, end: int) -> list[bytes]:
+        return []
+
+    def close(self) -> None:
+        _Extractor.closed = True
+
+
+def test_content_failure_stops_outline_stream_and_frames(monkeypatch):
+    outline_closed = asyncio.Event()
+
+    async def transcript(_):
+        return [TranscriptEntry(f'w{index}.', index * 5.0, 5.0) for index in range(120)]
+
+    async def gpt_stream(system, user, session):
+        try:
+            yield OUTLINE_START
+            for minute in range(10):
+                yield TOPIC % (minute, minute + 1)
+            await asyncio.sleep(10)
+        finally:
+            outline_closed.set()
+
+    async def gpt_request(system, user, session):
+        raise RuntimeError('model failed')
+
+    monkeypatch.setattr(ArticleGenerator, '_get_transacript', transcript)
+    monkeypatch.setattr(article, 'gpt_stream', gpt_stream)
+    monkeypatch.setattr(article, 'gpt_request', gpt_request)
+    monkeypatch.setattr(article, 'FrameExtractor', _Extractor)
+    scheduler = PipelineScheduler(
+        transcript_workers=1, llm_workers=4, frame_workers=1, download_workers=1,
+    )
+    request = ArticleRequest(url='https://youtu.be/abc', number_of_paragraphs=3)
+    generator = ArticleGenerator(request=request, session=None, scheduler=scheduler)  # type: ignore
+
+    start_time = time.monotonic()
+    with pytest.raises(RuntimeError, match='model failed'):
+        asyncio.run(generator.generate_article())
+    scheduler.shutdown()
+    assert time.monotonic() - start_time < 2
+    assert outline_closed.is_set()
+    assert generator._cancelled.is_set()
+    assert _Extractor.closed
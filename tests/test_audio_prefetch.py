@@ -0,0 +1,158 @@
+import asyncio
+import tempfile
+import threading
+
+import pytest
+from youtube_transcript_api import _errors as youtube_transcript_errors
+
+from src.schemas import ArticleRequest, TranscriptEntry
+from src.services import article, media
+from src.services.article import ArticleGenerator
+from src.services.media import MediaCache, MediaDownloadCancelled, MediaFormat
+
+
+CAPTIONS = [TranscriptEntry('captions', 0, 1)]
+WHISPER = [TranscriptEntry('whisper', 0, 1)]
+
+
+class _Whisper:
+    """Заменяет Whisper: загрузка звука управляется тестом, распознанный файл запоминается"""
+    def __init__(self, download) -> None:
+        self.download = download
+        self.downloads: list[tuple[bool, object]] = []
+        self.finished = threading.Event()
+        self.transcribed = None
+
+    def __call__(self, url, session):
+        return self
+
+    def download_audio(self, cancelled=None, max_bytes=None):
+        self.downloads.append((cancelled is not None, max_bytes))
+        try:
+            return self.download(cancelled)
+        finally:
+            self.finished.set()
+
+    async def get_transcript(self, audio):
+        self.transcribed = audio
+        return WHISPER
+
+
+def _generator(monkeypatch, whisper: _Whisper, captions) -> ArticleGenerator:
+    class _YouTube:
+        def __init__(self, url, session) -> None:
+            pass
+
+        async def get_transcript(self):
+            return await captions()
+
+    monkeypatch.setattr(article, 'WhisperTranscriptProvider', whisper)
+    monkeypatch.setattr(article, 'YouTubeTranscriptProvider', _YouTube)
+    request = ArticleRequest(url='https://youtu.be/abc', prefetch_audio=True)
+    return ArticleGenerator(request=request, session=None, scheduler=None)  # type: ignore
+
+
+async def _get_transcript(generator: ArticleGenerator):
+    transcript = await generator._get_transacript()
+    # Даёт выполниться обратному вызову, который закрывает ненужный файл
+    await asyncio.sleep(0.05)
+    return transcript
+
+
+def test_captions_cancel_running_download(monkeypatch):
+    seen_cancel = threading.Event()
+
+    def download(cancelled):
+        if cancelled.wait(5):
+            seen_cancel.set()
+        return None
+
+    async def captions():
+        await asyncio.sleep(0.05)
+        return CAPTIONS
+
+    whisper = _Whisper(download)
+    assert asyncio.run(_get_transcript(_generator(monkeypatch, whisper, captions))) == CAPTIONS
+    assert whisper.finished.wait(5)
+    assert seen_cancel.is_set()
+    assert whisper.downloads == [(True, article.AUDIO_PREFETCH_MAX_BYTES)]
+
+
+def test_captions_close_downloaded_file(monkeypatch):
+    audio = tempfile.TemporaryFile()
+    whisper = _Whisper(lambda cancelled: audio)
+
+    async def captions():
+        await asyncio.get_running_loop().run_in_executor(None, whisper.finished.wait, 5)
+        return CAPTIONS
+
+    assert asyncio.run(_get_transcript(_generator(monkeypatch, whisper, captions))) == CAPTIONS
+    assert audio.closed
+    assert whisper.transcribed is None
+
+
+def test_disabled_captions_use_prefetched_file(monkeypatch):
+    audio = tempfile.TemporaryFile()
+    whisper = _Whisper(lambda cancelled: audio)
+
+    async def captions():
+        raise youtube_transcript_errors.TranscriptsDisabled('abc')
+
+    assert asyncio.run(_get_transcript(_generator(monkeypatch, whisper, captions))) == WHISPER
+    assert whisper.transcribed is audio
+    assert not audio.closed
+    assert whisper.downloads == [(True, article.AUDIO_PREFETCH_MAX_BYTES)]
+    audio.close()
+
+
+def test_prefetch_over_limit_falls_back_to_full_download(monkeypatch):
+    audio = tempfile.TemporaryFile()
+    whisper = _Whisper(lambda cancelled: None if cancelled is not None else audio)
+
+    async def captions():
+        await asyncio.get_running_loop().run_in_executor(None, whisper.finished.wait, 5)
+        raise youtube_transcript_errors.TranscriptsDisabled('abc')
+
+    assert asyncio.run(_get_transcript(_generator(monkeypatch, whisper, captions))) == WHISPER
+    assert whisper.transcribed is audio
+    assert whisper.downloads == [(True, article.AUDIO_PREFETCH_MAX_BYTES), (False, None)]
+    audio.close()
+
+
+class _YoutubeDL:
+    """Заменяет yt-dlp: сообщает о загрузке по 1 КБ, пока хук её не прервёт"""
+    def __init__(self, options: dict) -> None:
+        self.options = options
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def download(self, urls):
+        with open(self.options['outtmpl'], 'wb') as file:
+            for downloaded in range(1024, 10 * 1024 + 1, 1024):
+                file.write(b'0' * 1024)
+                for hook in self.options['progress_hooks']:
+                    hook({'status': 'downloading', 'downloaded_bytes': downloaded})
+
+
+def test_cache_download_respects_max_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(media.yt_dlp, 'YoutubeDL', _YoutubeDL)
+    cache = MediaCache(str(tmp_path), max_bytes=1024 ** 2)
+    with pytest.raises(MediaDownloadCancelled, match='exceeds 4096 bytes'):
+        cache.open('https://youtu.be/abc', MediaFormat.AUDIO, max_bytes=4096)
+    assert not [path for path in tmp_path.iterdir() if not path.name.endswith(('.use', '.download'))]
+    with cache.open('https://youtu.be/abc', MediaFormat.AUDIO) as audio:
+        assert len(audio.read()) == 10 * 1024
+
+
+def test_cancelled_prefetch_does_not_wait_for_cache_lock(tmp_path):
+    cache = MediaCache(str(tmp_path), max_bytes=1024 ** 2)
+    cancelled = threading.Event()
+    cancelled.set()
+    with open(tmp_path / '.abc-audio.download', 'a+b') as lock:
+        media.fcntl.flock(lock, media.fcntl.LOCK_EX)
+        with pytest.raises(MediaDownloadCancelled):
+            cache.open('https://youtu.be/abc', MediaFormat.AUDIO, cancelled)
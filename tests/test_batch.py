@@ -0,0 +1,57 @@
+import asyncio
+import itertools
+
+from src.schemas import ArticleRequest, BatchArticleRequest
+from src.services import batch
+from src.services.batch import expand_batch_request
+
+
+PLAYLIST_URL = 'https://www.youtube.com/playlist?list=PL123'
+
+
+class _Playlist:
+    """Бесконечный плейлист, запоминающий, сколько видео из него прочитано"""
+    taken = 0
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+    @property
+    def video_urls(self):
+        for index in itertools.count():
+            _Playlist.taken = index + 1
+            yield f'https://www.youtube.com/watch?v=video{index:06d}'
+
+
+def _expand(monkeypatch, batch_request: BatchArticleRequest, max_size: int):
+    monkeypatch.setattr(batch, 'Playlist', _Playlist)
+    _Playlist.taken = 0
+    return asyncio.run(expand_batch_request(batch_request, max_size))
+
+
+def test_playlist_is_read_only_past_max_size(monkeypatch):
+    requests = _expand(monkeypatch, BatchArticleRequest(playlist_url=PLAYLIST_URL), 5)
+    assert len(requests) == 6
+    assert _Playlist.taken == 6
+    assert requests[0].url == 'https://www.youtube.com/watch?v=video000000'
+
+
+def test_playlist_limit_counts_explicit_requests(monkeypatch):
+    batch_request = BatchArticleRequest(
+        requests=[ArticleRequest(url='https://youtu.be/abc')] * 2,
+        playlist_url=PLAYLIST_URL,
+        playlist_options={'number_of_paragraphs': 3},
+    )
+    requests = _expand(monkeypatch, batch_request, 5)
+    assert len(requests) == 6
+    assert _Playlist.taken == 4
+    assert requests[-1].number_of_paragraphs == 3
+
+
+def test_playlist_is_not_read_when_requests_exceed_max_size(monkeypatch):
+    batch_request = BatchArticleRequest(
+        requests=[ArticleRequest(url='https://youtu.be/abc')] * 6,
+        playlist_url=PLAYLIST_URL,
+    )
+    assert len(_expand(monkeypatch, batch_request, 5)) == 6
+    assert _Playlist.taken == 0
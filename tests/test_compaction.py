@@ -0,0 +1,81 @@
+import pytest
+
+from src.schemas import TranscriptEntry, TranscriptGranularity
+from src.services.transcript.compaction import (
+    _merge_entries, compact_transcript, estimate_tokens, format_transcript,
+)
+
+
+def _entries(*texts: str, step: float = 2) -> list[TranscriptEntry]:
+    return [TranscriptEntry(text, index * step, step) for index, text in enumerate(texts)]
+
+
+def _words(count: int, step: float = 2) -> list[TranscriptEntry]:
+    return _entries(*[f'word{index}' for index in range(count)], step=step)
+
+
+def test_sentence_ends_merged_line():
+    entries = _entries('Hello', 'world.', 'How  are', 'you?', 'Fine')
+    merged = _merge_entries(entries, TranscriptGranularity.SENTENCE, window=30)
+    assert [entry.text for entry in merged] == ['Hello world.', 'How are you?', 'Fine']
+    assert [(entry.start, entry.duration) for entry in merged] == [(0, 4), (4, 4), (8, 2)]
+
+
+def test_sentence_is_cut_by_window():
+    merged = _merge_entries(_words(10), TranscriptGranularity.SENTENCE, window=6)
+    assert [entry.text for entry in merged] == [
+        'word0 word1 word2', 'word3 word4 word5', 'word6 word7 word8', 'word9',
+    ]
+    assert [entry.start for entry in merged] == [0, 6, 12, 18]
+
+
+def test_window_ignores_sentence_endings():
+    entries = _entries('One.', 'Two.', 'Three.', 'Four.')
+    merged = _merge_entries(entries, TranscriptGranularity.WINDOW, window=4)
+    assert [entry.text for entry in merged] == ['One. Two.', 'Three. Four.']
+
+
+def test_raw_is_passed_through():
+    entries = _entries('Hello', 'world.')
+    result, report = compact_transcript(entries, TranscriptGranularity.RAW, 30, token_budget=1)
+    assert result == entries
+    assert report.window == 30
+    assert report.entries_before == report.entries_after == 2
+    assert report.tokens_before == report.tokens_after
+
+
+def test_report_counts():
+    entries = _entries('Hello', 'world.', 'Bye.')
+    result, report = compact_transcript(entries, TranscriptGranularity.SENTENCE, 30, 10 ** 6)
+    assert [entry.text for entry in result] == ['Hello world.', 'Bye.']
+    assert report.granularity == TranscriptGranularity.SENTENCE
+    assert report.window == 30
+    assert (report.entries_before, report.entries_after) == (3, 2)
+    assert report.tokens_before == estimate_tokens(format_transcript(entries))
+    assert report.tokens_after == estimate_tokens(format_transcript(result))
+    assert report.tokens_after < report.tokens_before
+
+
+def test_window_doubles_until_transcript_fits_budget():
+    entries = _words(120)
+    budget = estimate_tokens(format_transcript(_merge_entries(
+        entries, TranscriptGranularity.WINDOW, 20,
+    )))
+    result, report = compact_transcript(entries, TranscriptGranularity.WINDOW, 5, budget)
+    assert report.window == 20
+    assert report.tokens_after <= budget
+    assert result == _merge_entries(entries, TranscriptGranularity.WINDOW, 20)
+
+
+def test_window_stops_at_one_minute():
+    _, report = compact_transcript(_words(120), TranscriptGranularity.WINDOW, 25, token_budget=1)
+    assert report.window == 60
+    assert report.entries_after == 4
+    assert report.tokens_after > 1
+
+
+@pytest.mark.parametrize('granularity', list(TranscriptGranularity))
+def test_empty_transcript(granularity):
+    result, report = compact_transcript([], granularity, 30, 100)
+    assert result == []
+    assert report.entries_before == report.entries_after == 0
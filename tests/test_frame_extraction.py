@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.schemas import ArticleRequest
+from src.services import article
+from src.services.article import ArticleGenerator
+from src.services.scheduler import PipelineScheduler
+
+
+class _FakeExtractor:
+    instances: list['_FakeExtractor'] = []
+
+    def __init__(self, url, *options):
+        self.url = url
+        self.cancelled = options[3]
+        self.periods: list[tuple[int, int]] = []
+        self.closed = False
+        self.instances.append(self)
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled.is_set()
+
+    def extract(self, start: int, end: int) -> list[bytes]:
+        self.periods.append((start, end))
+        return [f'{start}-{end}'.encode()]
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class _SlowMediaCache:
+    """Кэш, загрузка в который идёт, пока не установлено `downloaded`"""
+    def __init__(self) -> None:
+        self.downloaded = threading.Event()
+
+    @contextmanager
+    def use(self, url, media_format, cancelled):
+        self.downloaded.wait(5)
+        yield Path('/cache/abc-video')
+
+
+def _generator(
+    monkeypatch,
+    scheduler: PipelineScheduler,
+    media_cache=None,
+) -> ArticleGenerator:
+    monkeypatch.setattr(article, 'FrameExtractor', _FakeExtractor)
+    _FakeExtractor.instances.clear()
+    request = ArticleRequest(url='https://youtu.be/abc')
+    return ArticleGenerator(
+        request=request, session=None, scheduler=scheduler, media_cache=media_cache,  # type: ignore
+    )
+
+
+def test_waiting_for_periods_does_not_hold_frame_worker(monkeypatch):
+    scheduler = PipelineScheduler(
+        transcript_workers=1, llm_workers=1, frame_workers=1, download_workers=1,
+    )
+    generator = _generator(monkeypatch, scheduler)
+
+    async def run():
+        periods: asyncio.Queue = asyncio.Queue()
+        extraction = asyncio.create_task(generator._extract_frames(periods))
+        await asyncio.sleep(0.05)
+        # Единственный поток пула свободен, пока промежутков нет
+        other = await asyncio.wait_for(scheduler.run_frames(threading.current_thread), 1)
+        periods.put_nowait((0, 10))
+        periods.put_nowait((10, 20))
+        periods.put_nowait(None)
+        frames, _ = await extraction
+        return other, frames
+
+    other, frames = asyncio.run(run())
+    scheduler.shutdown()
+    assert other.name.startswith('frames')
+    assert frames == [[b'0-10'], [b'10-20']]
+    assert _FakeExtractor.instances[0].closed
+
+
+def test_cancelled_extraction_closes_video(monkeypatch):
+    scheduler = PipelineScheduler(
+        transcript_workers=1, llm_workers=1, frame_workers=1, download_workers=1,
+    )
+    generator = _generator(monkeypatch, scheduler)
+
+    async def run():
+        periods: asyncio.Queue = asyncio.Queue()
+        periods.put_nowait((0, 10))
+        extraction = asyncio.create_task(generator._extract_frames(periods))
+        await asyncio.sleep(0.05)
+        extraction.cancel()
+        await asyncio.gather(extraction, return_exceptions=True)
+
+    asyncio.run(run())
+    scheduler.shutdown()
+    extractor = _FakeExtractor.instances[0]
+    assert extractor.periods == [(0, 10)]
+    assert extractor.closed
+    assert generator._cancelled.is_set()
+
+
+def test_cache_download_does_not_hold_frame_worker(monkeypatch):
+    scheduler = PipelineScheduler(
+        transcript_workers=1, llm_workers=1, frame_workers=1, download_workers=1,
+    )
+    media_cache = _SlowMediaCache()
+    generator = _generator(monkeypatch, scheduler, media_cache)
+
+    async def run():
+        periods: asyncio.Queue = asyncio.Queue()
+        periods.put_nowait((0, 10))
+        periods.put_nowait(None)
+        extraction = asyncio.create_task(generator._extract_frames(periods))
+        await asyncio.sleep(0.05)
+        # Пока видео загружается, поток декодирования доступен другим запросам
+        other = await asyncio.wait_for(scheduler.run_frames(threading.current_thread), 1)
+        media_cache.downloaded.set()
+        frames, _ = await extraction
+        return other, frames
+
+    other, frames = asyncio.run(run())
+    scheduler.shutdown()
+    assert other.name.startswith('frames')
+    assert frames == [[b'0-10']]
+    assert _FakeExtractor.instances[0].url == '/cache/abc-video'
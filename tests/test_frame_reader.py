@@ -0,0 +1,53 @@
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+from src.schemas import DecodeMode
+from src.services.screenshots import frame_reader
+from src.services.screenshots.frame_reader import get_frame_reader
+from src.services.video import VideoStream, probe_local_video
+
+
+@pytest.fixture(name='video_path')
+def _video_path(tmp_path) -> str:
+    """Видео 64x48 длиной 5 секунд, 10 кадров в секунду"""
+    path = str(tmp_path / 'video.mp4')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48))
+    for index in range(50):
+        writer.write(np.full((48, 64, 3), index * 5, np.uint8))
+    writer.release()
+    return path
+
+
+def test_local_video_is_probed(video_path):
+    video_stream = probe_local_video(video_path)
+    assert (video_stream.width, video_stream.height, video_stream.fps) == (64, 48, 10)
+    assert video_stream.duration == pytest.approx(5)
+
+
+def test_local_reader_seeks_to_start(video_path):
+    reader = get_frame_reader(DecodeMode.NATIVE, local=True)(video_path, 2)
+    try:
+        seconds = [second for _, second in reader]
+    finally:
+        reader.close()
+    assert seconds[0] == 2
+    assert seconds[-1] == 4
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is not installed')
+def test_ffmpeg_reader_reuses_resolved_stream(video_path, monkeypatch):
+    def resolve(_: str) -> VideoStream:
+        raise AssertionError('stream must not be resolved again')
+
+    monkeypatch.setattr(frame_reader, 'resolve_video_stream', resolve)
+    video_stream = VideoStream(url=video_path, width=64, height=48, fps=10, duration=5)
+    reader = get_frame_reader(DecodeMode.LOW_FPS)('https://youtu.be/abc', 1, video_stream)
+    try:
+        frames = list(reader)
+    finally:
+        reader.close()
+    assert [second for _, second in frames] == [1, 2, 3, 4]
+    assert frames[0][0].shape == (48, 64, 3)
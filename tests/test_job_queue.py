@@ -0,0 +1,139 @@
+import pytest
+
+from src.jobs import redis_, sqlite
+from src.jobs.redis_ import RedisJobQueue
+from src.jobs.sqlite import SqliteJobQueue
+from src.schemas import Article, ArticleRequest, GenerationTime, JobStatus
+
+
+class _Clock:
+    """Подменяет time в модулях очередей, чтобы истечение heartbeat не требовало ожидания"""
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture(name='clock')
+def _clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(sqlite, 'time', clock)
+    monkeypatch.setattr(redis_, 'time', clock)
+    return clock
+
+
+def _sqlite_queue(tmp_path, _) -> SqliteJobQueue:
+    return SqliteJobQueue(str(tmp_path / 'jobs.db'), heartbeat_timeout=60, max_attempts=2)
+
+
+def _redis_queue(_, monkeypatch) -> RedisJobQueue:
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis_.redis.Redis, 'from_url',
+        lambda url, **options: fakeredis.FakeRedis(server=server, **options),
+    )
+    return RedisJobQueue('redis://fake', heartbeat_timeout=60, max_attempts=2)
+
+
+@pytest.fixture(name='queue', params=[_sqlite_queue, _redis_queue], ids=['sqlite', 'redis'])
+def _queue(request, tmp_path, monkeypatch, clock):  # pylint: disable=unused-argument
+    return request.param(tmp_path, monkeypatch)
+
+
+def _request(video_id: str = 'dQw4w9WgXcQ') -> ArticleRequest:
+    return ArticleRequest(url=f'https://www.youtube.com/watch?v={video_id}')
+
+
+def test_claim_returns_oldest_job_once(queue, clock):
+    first = queue.enqueue(_request('aaaaaaaaaaa'))
+    clock.now += 1
+    second = queue.enqueue(_request('bbbbbbbbbbb'))
+
+    job = queue.claim('worker-1')
+    assert job.id == first
+    assert job.status == JobStatus.RUNNING
+    assert job.attempts == 1
+    assert job.request == _request('aaaaaaaaaaa')
+    assert queue.claim('worker-2').id == second
+    assert queue.claim('worker-3') is None
+
+
+def test_complete_stores_article(queue):
+    job_id = queue.enqueue(_request())
+    queue.claim('worker')
+    article = Article(title='Title', description='', topics=[], generation_time=GenerationTime())
+    queue.complete(job_id, 'worker', article)
+
+    job = queue.get(job_id)
+    assert job.status == JobStatus.DONE
+    assert job.result == article
+    assert queue.claim('worker') is None
+
+
+def test_heartbeat_keeps_job_until_it_expires(queue, clock):
+    job_id = queue.enqueue(_request())
+    queue.claim('worker-1')
+
+    clock.now += 50
+    assert queue.heartbeat(job_id, 'worker-1')
+    clock.now += 50
+    assert queue.claim('worker-2') is None
+
+    clock.now += 61
+    job = queue.claim('worker-2')
+    assert job.id == job_id
+    assert job.attempts == 2
+    assert not queue.heartbeat(job_id, 'worker-1')
+    assert queue.heartbeat(job_id, 'worker-2')
+
+
+def test_failed_job_is_retried(queue):
+    job_id = queue.enqueue(_request())
+    queue.claim('worker-1')
+    queue.fail(job_id, 'worker-1', 'boom')
+
+    job = queue.get(job_id)
+    assert job.status == JobStatus.QUEUED
+    assert job.error == 'boom'
+    assert queue.claim('worker-2').attempts == 2
+
+
+def test_fail_after_max_attempts(queue):
+    job_id = queue.enqueue(_request())
+    for attempt in range(2):
+        queue.claim(f'worker-{attempt}')
+        queue.fail(job_id, f'worker-{attempt}', f'error {attempt}')
+
+    job = queue.get(job_id)
+    assert job.status == JobStatus.FAILED
+    assert job.error == 'error 1'
+    assert queue.claim('worker') is None
+
+
+def test_expired_job_after_max_attempts_fails(queue, clock):
+    job_id = queue.enqueue(_request())
+    queue.claim('worker-1')
+    clock.now += 61
+    queue.claim('worker-2')
+    clock.now += 61
+
+    assert queue.claim('worker-3') is None
+    job = queue.get(job_id)
+    assert job.status == JobStatus.FAILED
+    assert job.error == 'Worker stopped responding'
+    assert job.attempts == 2
+
+
+def test_stale_worker_cannot_finish_reclaimed_job(queue, clock):
+    job_id = queue.enqueue(_request())
+    queue.claim('worker-1')
+    clock.now += 61
+    queue.claim('worker-2')
+
+    queue.fail(job_id, 'worker-1', 'late error')
+    job = queue.get(job_id)
+    assert job.status == JobStatus.RUNNING
+    assert job.error is None
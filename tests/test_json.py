@@ -0,0 +1,16 @@
+import asyncio
+import json
+
+from src.utils.json_ import aiter_dumps, iter_dumps
+
+
+async def _collect(obj, chunk_size: int) -> list[bytes]:
+    return [chunk async for chunk in aiter_dumps(obj, chunk_size)]
+
+
+def test_aiter_dumps_matches_iter_dumps():
+    obj = {'title': 'Статья', 'topics': [{'images': ['a' * 100, 'b' * 30], 'end': None}]}
+    chunks = asyncio.run(_collect(obj, 16))
+    assert chunks == list(iter_dumps(obj, 16))
+    assert len(chunks) > 1
+    assert json.loads(b''.join(chunks)) == obj
@@ -0,0 +1,262 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from src import main
+from src.schemas import ArticleRequest
+from src.services import media
+from src.services.media import (
+    MediaCache, MediaDownloadCancelled, MediaFormat, create_upload_path, get_local_media_path,
+)
+from src.utils.youtube import get_video_id
+
+
+FILE_SIZE = 100
+
+
+def _url(video_id: str) -> str:
+    return f'https://www.youtube.com/watch?v={video_id}'
+
+
+@pytest.fixture(name='media_root')
+def _media_root(tmp_path, monkeypatch) -> Path:
+    root = tmp_path / 'media'
+    (root / 'videos').mkdir(parents=True)
+    (root / 'videos' / 'clip.mp4').write_bytes(b'video')
+    (tmp_path / 'secret.mp4').write_bytes(b'secret')
+    monkeypatch.setattr(media, 'MEDIA_ROOT', str(root))
+    return root
+
+
+def test_local_media_path_inside_root(media_root):
+    assert get_local_media_path('videos/clip.mp4') == media_root / 'videos' / 'clip.mp4'
+
+
+@pytest.mark.parametrize('path', ['../secret.mp4', 'videos/../../secret.mp4'])
+def test_local_media_path_traversal_is_rejected(media_root, path):
+    with pytest.raises(ValueError):
+        get_local_media_path(path)
+
+
+def test_symlink_outside_root_is_rejected(media_root):
+    (media_root / 'videos' / 'link.mp4').symlink_to(media_root.parent / 'secret.mp4')
+    (media_root / 'outside').symlink_to(media_root.parent, target_is_directory=True)
+    with pytest.raises(ValueError):
+        get_local_media_path('videos/link.mp4')
+    with pytest.raises(ValueError):
+        get_local_media_path('outside/secret.mp4')
+
+
+def test_symlink_inside_root_is_allowed(media_root):
+    (media_root / 'link.mp4').symlink_to(media_root / 'videos' / 'clip.mp4')
+    assert get_local_media_path('link.mp4') == media_root / 'videos' / 'clip.mp4'
+
+
+def test_missing_or_directory_media_path(media_root):
+    with pytest.raises(FileNotFoundError):
+        get_local_media_path('videos/missing.mp4')
+    with pytest.raises(FileNotFoundError):
+        get_local_media_path('videos')
+
+
+@pytest.mark.parametrize('path', ['clip.mp4', 'uploads/0f3a.mp4', 'a/b-c_d.v2.webm'])
+def test_media_path_regex_accepts_relative_paths(path):
+    assert ArticleRequest(path=path).path == path
+
+
+@pytest.mark.parametrize('path', [
+    '/etc/passwd', '../clip.mp4', 'videos/../clip.mp4', '.hidden.mp4', 'videos/.cache/a.mp4',
+    'a b.mp4', 'a\\b.mp4', '',
+])
+def test_media_path_regex_rejects_unsafe_paths(path):
+    with pytest.raises(ValidationError):
+        ArticleRequest(path=path)
+
+
+def test_upload_path_keeps_only_simple_extension(media_root):
+    relative_path, full_path = create_upload_path('../../clip.MP4')
+    assert relative_path.startswith('uploads/') and relative_path.endswith('.mp4')
+    assert full_path == media_root / relative_path
+    assert '.' not in create_upload_path('clip.mp4/../evil')[0]
+
+
+class _UploadRequest:
+    """Тело запроса загрузки, отдаваемое частями по 256 КБ"""
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    async def stream(self):
+        for start in range(0, self.size, 256 * 1024):
+            yield b'0' * min(256 * 1024, self.size - start)
+
+
+def test_upload_within_limit_is_saved(media_root, monkeypatch):
+    monkeypatch.setattr(main, 'MEDIA_UPLOAD_MAX_MB', 1)
+    uploaded = asyncio.run(main.upload_media(_UploadRequest(1024 * 1024), 'clip.mp4'))
+    assert (media_root / uploaded.path).stat().st_size == 1024 * 1024
+    assert get_local_media_path(uploaded.path)
+
+
+def test_upload_over_limit_is_rejected_and_removed(media_root, monkeypatch):
+    monkeypatch.setattr(main, 'MEDIA_UPLOAD_MAX_MB', 1)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.upload_media(_UploadRequest(1024 * 1024 + 1), 'clip.mp4'))
+    assert error.value.status_code == 413
+    assert not list((media_root / 'uploads').iterdir())
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ#t=10',
+    'https://youtu.be/dQw4w9WgXcQ?t=5',
+    'https://www.youtube.com/embed/dQw4w9WgXcQ',
+])
+def test_video_id_is_extracted(url):
+    assert get_video_id(url) == 'dQw4w9WgXcQ'
+
+
+def test_cache_key_uses_video_id(tmp_path, downloads):
+    cache = MediaCache(str(tmp_path), max_bytes=10 * FILE_SIZE)
+    with cache.use('https://youtu.be/dQw4w9WgXcQ', MediaFormat.AUDIO):
+        pass
+    with cache.use('https://www.youtube.com/watch?v=dQw4w9WgXcQ', MediaFormat.AUDIO) as path:
+        assert path.name == 'dQw4w9WgXcQ-audio'
+    assert len(downloads.urls) == 1
+
+
+class _Downloads:
+    """Заменяет yt-dlp: пишет файл заданного размера и считает загрузки"""
+    def __init__(self, delay: float = 0) -> None:
+        self.delay = delay
+        self.urls: list[str] = []
+
+    def __call__(self, url, media_format, path, cancelled, max_bytes) -> None:
+        self.urls.append(url)
+        time.sleep(self.delay)
+        path.write_bytes(b'0' * FILE_SIZE)
+
+
+@pytest.fixture(name='downloads')
+def _downloads(monkeypatch) -> _Downloads:
+    downloads = _Downloads()
+    monkeypatch.setattr(MediaCache, '_download', downloads)
+    return downloads
+
+
+def _cached(directory: Path) -> set[str]:
+    return {path.name for path in directory.iterdir() if not path.name.startswith('.')}
+
+
+def test_second_use_is_cache_hit(tmp_path, downloads):
+    cache = MediaCache(str(tmp_path), max_bytes=10 * FILE_SIZE)
+    for _ in range(2):
+        with cache.use(_url('aaaaaaaaaaa'), MediaFormat.VIDEO) as path:
+            assert path.read_bytes() == b'0' * FILE_SIZE
+    assert downloads.urls == [_url('aaaaaaaaaaa')]
+    assert _cached(tmp_path) == {'aaaaaaaaaaa-video'}
+
+
+def test_least_recently_used_is_evicted(tmp_path, downloads):
+    cache = MediaCache(str(tmp_path), max_bytes=2 * FILE_SIZE)
+    for index, video_id in enumerate(['aaaaaaaaaaa', 'bbbbbbbbbbb', 'aaaaaaaaaaa']):
+        with cache.use(_url(video_id), MediaFormat.VIDEO) as path:
+            os.utime(path, (index, index))
+    with cache.use(_url('ccccccccccc'), MediaFormat.VIDEO):
+        pass
+    assert _cached(tmp_path) == {'aaaaaaaaaaa-video', 'ccccccccccc-video'}
+    assert len(downloads.urls) == 3
+
+
+def test_file_in_use_is_not_evicted(tmp_path, downloads):
+    cache = MediaCache(str(tmp_path), max_bytes=FILE_SIZE)
+    with cache.use(_url('aaaaaaaaaaa'), MediaFormat.VIDEO) as path:
+        os.utime(path, (0, 0))
+        with cache.use(_url('bbbbbbbbbbb'), MediaFormat.VIDEO):
+            assert _cached(tmp_path) == {'aaaaaaaaaaa-video', 'bbbbbbbbbbb-video'}
+        assert path.is_file()
+    with cache.use(_url('ccccccccccc'), MediaFormat.AUDIO):
+        pass
+    assert _cached(tmp_path) == {'ccccccccccc-audio'}
+
+
+def test_eviction_tolerates_files_removed_by_another_process(tmp_path, downloads, monkeypatch):
+    cache = MediaCache(str(tmp_path), max_bytes=0)
+    (tmp_path / 'aaaaaaaaaaa-video').write_bytes(b'0')
+    (tmp_path / 'bbbbbbbbbbb-video').write_bytes(b'0')
+    iterdir = Path.iterdir
+
+    def iterdir_then_remove(directory):
+        paths = list(iterdir(directory))
+        (tmp_path / 'aaaaaaaaaaa-video').unlink(missing_ok=True)
+        return iter(paths)
+
+    monkeypatch.setattr(Path, 'iterdir', iterdir_then_remove)
+    cache._evict()
+    assert _cached(tmp_path) == set()
+
+
+def test_concurrent_misses_download_once(tmp_path, monkeypatch):
+    downloads = _Downloads(delay=0.2)
+    monkeypatch.setattr(MediaCache, '_download', downloads)
+    cache = MediaCache(str(tmp_path), max_bytes=10 * FILE_SIZE)
+
+    def use():
+        with cache.use(_url('aaaaaaaaaaa'), MediaFormat.VIDEO) as path:
+            assert path.is_file()
+
+    threads = [threading.Thread(target=use) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(downloads.urls) == 1
+
+
+def test_cancelled_request_does_not_wait_for_other_download(tmp_path, monkeypatch):
+    monkeypatch.setattr(MediaCache, '_download', _Downloads(delay=1))
+    cache = MediaCache(str(tmp_path), max_bytes=10 * FILE_SIZE)
+    downloading = threading.Thread(
+        target=lambda: cache.open(_url('aaaaaaaaaaa'), MediaFormat.AUDIO).close()
+    )
+    downloading.start()
+    time.sleep(0.1)
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+    start = time.monotonic()
+    with pytest.raises(MediaDownloadCancelled):
+        cache.open(_url('aaaaaaaaaaa'), MediaFormat.AUDIO, cancelled)
+    assert time.monotonic() - start < 0.5
+    downloading.join()
+
+
+def _hold_in_other_process(directory: str, ready, release) -> None:
+    cache = MediaCache(directory, max_bytes=10 * FILE_SIZE)
+    with cache.use(_url('aaaaaaaaaaa'), MediaFormat.VIDEO):
+        ready.set()
+        release.wait(5)
+
+
+def test_file_used_by_another_process_is_not_evicted(tmp_path, downloads):
+    (tmp_path / 'aaaaaaaaaaa-video').write_bytes(b'0' * FILE_SIZE)
+    context = multiprocessing.get_context('fork')
+    ready, release = context.Event(), context.Event()
+    process = context.Process(target=_hold_in_other_process, args=(str(tmp_path), ready, release))
+    process.start()
+    try:
+        assert ready.wait(5)
+        os.utime(tmp_path / 'aaaaaaaaaaa-video', (0, 0))
+        MediaCache(str(tmp_path), max_bytes=0)
+        assert _cached(tmp_path) == {'aaaaaaaaaaa-video'}
+    finally:
+        release.set()
+        process.join()
+    MediaCache(str(tmp_path), max_bytes=0)
+    assert _cached(tmp_path) == set()
+    assert not downloads.urls
@@ -0,0 +1,49 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from src import main
+from src.services import profiling
+from src.services.profiling import RequestProfiler, check_profiling_available
+
+
+class _FakeProfiler:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def test_missing_pyinstrument_fails_at_startup(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyinstrument', None)
+    with pytest.raises(RuntimeError, match='poetry install -E profiling'):
+        check_profiling_available()
+
+
+def test_profile_saves_files_off_event_loop(monkeypatch):
+    monkeypatch.setattr(profiling, '_create_profiler', lambda async_mode: _FakeProfiler())
+    saved = []
+    monkeypatch.setattr(
+        RequestProfiler, '_save',
+        lambda self, name, profiler: saved.append((name, threading.current_thread())),
+    )
+    monkeypatch.setattr(
+        RequestProfiler, '_save_stages',
+        lambda self: saved.append(('stages', threading.current_thread())),
+    )
+
+    async def run():
+        async with RequestProfiler().profile('generate'):
+            pass
+
+    asyncio.run(run())
+    assert [name for name, _ in saved] == ['generate', 'stages']
+    assert all(thread is not threading.main_thread() for _, thread in saved)
+
+
+def test_profile_routes_absent_when_profiling_off():
+    assert main.PROFILING == 'off'
+    assert not [route for route in main.app.routes if route.path.startswith('/profiles')]
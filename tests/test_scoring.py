@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+
+from src.services.screenshots.scoring import (
+    bhattacharyya_distances, histograms, paired_bhattacharyya_distances, score_frames,
+    select_best,
+)
+
+
+SIZE = (90, 160)
+
+
+def _slide(seed: int) -> np.ndarray:
+    """Кадр, похожий на слайд: светлый фон, тёмные строки текста и рамка"""
+    random = np.random.default_rng(seed)
+    frame = np.full(SIZE, 230, np.uint8)
+    cv2.rectangle(frame, (4, 4), (155, 85), 40, 2)
+    for row in range(12, 80, 10):
+        width = int(random.integers(40, 140))
+        cv2.putText(frame, 'x' * (width // 8), (10, row + 6), cv2.FONT_HERSHEY_PLAIN, 0.7, 20)
+    return frame
+
+
+def _blank(value: int = 128) -> np.ndarray:
+    return np.full(SIZE, value, np.uint8)
+
+
+def _blurred(seed: int) -> np.ndarray:
+    return cv2.GaussianBlur(_slide(seed), (31, 31), 12)
+
+
+def test_slides_rank_above_blank_and_blurred_frames():
+    frames = np.stack([_blank(), _slide(0), _blurred(1), _slide(2), _blank(20), _blurred(3)])
+    scores, _ = score_frames(frames)
+    slides = scores[[1, 3]]
+    others = scores[[0, 2, 4, 5]]
+    assert slides.min() > others.max()
+
+
+def test_near_duplicates_are_dropped():
+    slide = _slide(0)
+    noisy = slide.copy()
+    noisy[0, 0] = 0
+    dark_slide = 255 - _slide(5)
+    frames = np.stack([slide, noisy, dark_slide, _blank()])
+    scores, hists = score_frames(frames)
+    selected = select_best(scores, hists, 3)
+    assert len(selected) == 3
+    assert not {0, 1} <= set(selected)
+    assert 2 in selected
+    assert 3 in selected
+
+
+def test_select_best_stops_at_count():
+    frames = np.stack([_slide(seed) for seed in range(5)] + [_blank(value) for value in (0, 255)])
+    scores, hists = score_frames(frames)
+    selected = select_best(scores, hists, 2)
+    assert len(selected) == 2
+    assert selected[0] == int(np.argmax(scores))
+
+
+def test_paired_distances_match_pairwise():
+    hists = histograms(np.stack([_slide(seed) for seed in range(4)] + [_blurred(4)]))
+    paired = paired_bhattacharyya_distances(hists[1:], hists[:-1])
+    pairwise = bhattacharyya_distances(hists[1:], hists[:-1])
+    assert np.allclose(paired, np.diagonal(pairwise))
+    assert np.allclose(paired_bhattacharyya_distances(hists, hists), 0, atol=1e-6)
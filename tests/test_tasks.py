@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from src.utils.tasks import TaskGroup, gather_or_cancel
+
+
+async def _fail(delay: float) -> None:
+    await asyncio.sleep(delay)
+    raise ValueError('failed')
+
+
+async def _sleep_forever(cancelled: list[str], name: str) -> None:
+    try:
+        await asyncio.sleep(10)
+    except asyncio.CancelledError:
+        cancelled.append(name)
+        raise
+
+
+def test_failed_task_cancels_block_and_siblings_promptly():
+    cancelled: list[str] = []
+
+    async def run():
+        async with TaskGroup() as group:
+            group.create_task(_sleep_forever(cancelled, 'sibling'))
+            group.create_task(_fail(0.01))
+            await _sleep_forever(cancelled, 'block')
+
+    start_time = time.monotonic()
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert time.monotonic() - start_time < 1
+    assert sorted(cancelled) == ['block', 'sibling']
+
+
+def test_block_error_cancels_tasks():
+    cancelled: list[str] = []
+
+    async def run():
+        async with TaskGroup() as group:
+            group.create_task(_sleep_forever(cancelled, 'task'))
+            await asyncio.sleep(0.01)
+            raise KeyError('block')
+
+    with pytest.raises(KeyError):
+        asyncio.run(run())
+    assert cancelled == ['task']
+
+
+def test_outer_cancellation_is_not_swallowed():
+    cancelled: list[str] = []
+
+    async def run():
+        async def block():
+            async with TaskGroup() as group:
+                group.create_task(_sleep_forever(cancelled, 'task'))
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(block())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert cancelled == ['task']
+
+
+def test_gather_or_cancel_returns_results_in_order():
+    async def value(result: int, delay: float) -> int:
+        await asyncio.sleep(delay)
+        return result
+
+    assert asyncio.run(gather_or_cancel(value(1, 0.02), value(2, 0))) == [1, 2]
+
+
+def test_gather_or_cancel_stops_siblings_on_error():
+    cancelled: list[str] = []
+
+    async def run():
+        await gather_or_cancel(_sleep_forever(cancelled, 'sibling'), _fail(0.01))
+
+    start_time = time.monotonic()
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert time.monotonic() - start_time < 1
+    assert cancelled == ['sibling']
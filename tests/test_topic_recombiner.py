@@ -0,0 +1,43 @@
+from src.schemas import ArticleTopic
+from src.services.article import _TopicRecombiner
+
+
+def _topics(*bounds: tuple[str, str]) -> list[ArticleTopic]:
+    return [ArticleTopic(start=start, end=end) for start, end in bounds]
+
+
+def _recombine(recombiner: _TopicRecombiner, topics: list[ArticleTopic]) -> list[tuple[str, str]]:
+    result = [merged for topic in topics for merged in recombiner.feed(topic)]
+    result.extend(recombiner.finish())
+    return [(topic.start, topic.end) for topic in result]
+
+
+def test_exact_number_of_topics_is_not_merged():
+    topics = _topics(('0:00:00', '0:02:00'), ('0:02:00', '0:04:00'), ('0:04:00', '0:06:00'))
+    assert _recombine(_TopicRecombiner(3, 120, 360), topics) == [
+        ('0:00:00', '0:02:00'), ('0:02:00', '0:04:00'), ('0:04:00', '0:06:00'),
+    ]
+
+
+def test_fewer_topics_than_requested_are_not_merged():
+    topics = _topics(('0:00:00', '0:02:00'), ('0:02:00', '0:04:00'), ('0:04:00', '0:06:00'))
+    assert _recombine(_TopicRecombiner(5, 72, 360), topics) == [
+        ('0:00:00', '0:02:00'), ('0:02:00', '0:04:00'), ('0:04:00', '0:06:00'),
+    ]
+
+
+def test_extra_topics_are_merged_to_requested_number():
+    topics = _topics(*[(f'0:0{minute}:00', f'0:0{minute + 1}:00') for minute in range(6)])
+    assert _recombine(_TopicRecombiner(3, 120, 360), topics) == [
+        ('0:00:00', '0:02:00'), ('0:02:00', '0:04:00'), ('0:04:00', '0:06:00'),
+    ]
+
+
+def test_topics_are_held_back_until_merging_is_needed():
+    recombiner = _TopicRecombiner(2, 120, 240)
+    topics = _topics(('0:00:00', '0:01:00'), ('0:01:00', '0:02:00'), ('0:02:00', '0:03:00'))
+    assert recombiner.feed(topics[0]) == []
+    assert recombiner.feed(topics[1]) == []
+    assert [(topic.start, topic.end) for topic in recombiner.feed(topics[2])] == [
+        ('0:00:00', '0:02:00'),
+    ]
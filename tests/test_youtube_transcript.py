@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+from youtube_transcript_api import _errors as youtube_transcript_errors
+
+from src.services.transcript import youtube
+from src.services.transcript.youtube import YouTubeTranscriptProvider
+
+
+VIDEO_URL = 'https://www.youtube.com/watch?v=abc123'
+CAPTIONS_XML = (
+    '<?xml version="1.0" encoding="utf-8" ?><transcript>'
+    '<text start="0.5" dur="2.1">Hello &amp;amp; welcome</text>'
+    '<text start="2.6" dur="1.4">&lt;font color="#fff"&gt;second&lt;/font&gt; line</text>'
+    '<text start="4">no duration</text>'
+    '</transcript>'
+)
+
+
+def _watch_page(tracks: list[dict]) -> str:
+    captions = {'playerCaptionsTracklistRenderer': {'captionTracks': tracks}}
+    return (
+        '<html><script>var ytInitialPlayerResponse = {"playabilityStatus": {}, '
+        f'"captions":{json.dumps(captions)},"videoDetails": {{}}}}</script></html>'
+    )
+
+
+def _fetch(handler, monkeypatch, **settings) -> list:
+    """Запрашивает расшифровку у локального сервера, отвечающего вместо YouTube"""
+    for name, value in settings.items():
+        monkeypatch.setattr(youtube, name, value)
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/{path:.*}', handler)
+        async with TestServer(app) as server:
+            monkeypatch.setattr(
+                YouTubeTranscriptProvider,
+                '_WATCH_URL',
+                str(server.make_url('/watch')) + '?v={video_id}',
+            )
+            async with ClientSession() as session:
+                provider = YouTubeTranscriptProvider(VIDEO_URL, session)
+                return await provider.get_transcript()
+
+    return asyncio.run(run())
+
+
+def test_parses_best_caption_track(monkeypatch):
+    requests = []
+
+    async def handler(request: web.Request) -> web.Response:
+        requests.append(str(request.rel_url))
+        if request.path == '/watch':
+            base_url = str(request.url.with_path('/captions').with_query(''))
+            return web.Response(text=_watch_page([
+                {'baseUrl': base_url + '?lang=de', 'languageCode': 'de'},
+                {'baseUrl': base_url + '?lang=en', 'languageCode': 'en', 'kind': 'asr'},
+                {'baseUrl': base_url + '?lang=en-manual', 'languageCode': 'en'},
+            ]), content_type='text/html')
+        return web.Response(text=CAPTIONS_XML, content_type='text/xml')
+
+    entries = _fetch(handler, monkeypatch)
+
+    assert requests == ['/watch?v=abc123', '/captions?lang=en-manual']
+    assert [(entry.text, entry.start, entry.duration) for entry in entries] == [
+        ('Hello & welcome', 0.5, 2.1),
+        ('second line', 2.6, 1.4),
+        ('no duration', 4.0, 0.0),
+    ]
+
+
+def test_disabled_captions(monkeypatch):
+    async def handler(_: web.Request) -> web.Response:
+        return web.Response(text='<html>"playabilityStatus": {}</html>', content_type='text/html')
+
+    with pytest.raises(youtube_transcript_errors.TranscriptsDisabled):
+        _fetch(handler, monkeypatch)
+
+
+def test_http_error_is_translated(monkeypatch):
+    async def handler(_: web.Request) -> web.Response:
+        return web.Response(status=500)
+
+    with pytest.raises(youtube_transcript_errors.YouTubeRequestFailed) as error:
+        _fetch(handler, monkeypatch)
+    assert error.value.video_id == 'abc123'
+    assert '500' in error.value.reason
+
+
+def test_timeout_is_translated(monkeypatch):
+    async def handler(_: web.Request) -> web.Response:
+        await asyncio.sleep(5)
+        return web.Response(text='')
+
+    with pytest.raises(youtube_transcript_errors.YouTubeRequestFailed) as error:
+        _fetch(handler, monkeypatch, YOUTUBE_TIMEOUT=0.1)
+    assert error.value.video_id == 'abc123'
+    assert 'No response in 0.1 seconds' in error.value.reason